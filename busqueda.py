@@ -0,0 +1,67 @@
+from bisect import bisect_left
+import re
+import threading
+import time
+import unicodedata
+from config import settings
+
+# Busqueda de texto en nombre/descripcion de productos. En MySQL la resuelve el
+# indice FULLTEXT (ver crud._buscar_productos); en el resto de motores se usa
+# este indice invertido en memoria, que se reconstruye tras invalidar() (altas,
+# cambios y bajas de productos) o al caducar el TTL, para recoger cambios
+# hechos por otros procesos.
+
+def terminos(texto: str):
+    # Minusculas, sin acentos y partido por caracteres que no son de palabra
+    texto = unicodedata.normalize("NFKD", texto or "")
+    texto = "".join(caracter for caracter in texto if not unicodedata.combining(caracter))
+    return [termino for termino in re.split(r"\W+", texto.lower()) if termino]
+
+
+class IndiceInvertido:
+    def __init__(self, ttl: float = 30.0):
+        self.ttl = ttl
+        self._postings = {}
+        self._vocabulario = []
+        self._caduca = 0.0
+        self._lock = threading.Lock()
+
+    def invalidar(self):
+        with self._lock:
+            self._caduca = 0.0
+
+    def _construir(self, filas):
+        postings = {}
+        for id_, *textos in filas:
+            for texto in textos:
+                for termino in terminos(texto):
+                    postings.setdefault(termino, set()).add(id_)
+        self._postings = postings
+        self._vocabulario = sorted(postings)
+        self._caduca = time.monotonic() + self.ttl
+
+    def _prefijo(self, prefijo: str):
+        # Ids de todos los terminos que empiezan por prefijo
+        ids = set()
+        posicion = bisect_left(self._vocabulario, prefijo)
+        while posicion < len(self._vocabulario) and self._vocabulario[posicion].startswith(prefijo):
+            ids |= self._postings[self._vocabulario[posicion]]
+            posicion += 1
+        return ids
+
+    def buscar(self, consulta: str, cargar):
+        # Ids que contienen todos los terminos de la consulta (como prefijo).
+        # cargar() devuelve las filas (id, texto, ...) para reconstruir el indice
+        with self._lock:
+            if self._caduca < time.monotonic():
+                self._construir(cargar())
+            resultado = None
+            for termino in terminos(consulta):
+                ids = self._prefijo(termino)
+                resultado = ids if resultado is None else resultado & ids
+                if not resultado:
+                    break
+            return resultado or set()
+
+# Nombre y descripcion de los productos
+productos = IndiceInvertido(ttl=settings.cache_ttl)
@@ -0,0 +1,182 @@
+from collections import OrderedDict
+import pickle
+import threading
+import time
+from config import settings
+
+# Caches de lectura con invalidacion por generacion: invalidar() incrementa la
+# generacion y descarta lo guardado, y set() ignora los valores leidos de la
+# base de datos con una generacion anterior, de modo que una lectura que
+# compite con una escritura no deja datos viejos en la cache.
+
+class CacheLRU:
+    # Cache en memoria del proceso, LRU acotada por tamano y con TTL
+    def __init__(self, max_items: int = 1024, ttl: float = 30.0):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._generacion = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidaciones = 0
+
+    def generacion(self):
+        return self._generacion
+
+    def get(self, clave):
+        # Devuelve (encontrado, valor) para poder cachear tambien None
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None or entrada[0] < time.monotonic():
+                if entrada is not None:
+                    del self._datos[clave]
+                self.misses += 1
+                return False, None
+            self._datos.move_to_end(clave)
+            self.hits += 1
+            return True, entrada[1]
+
+    def set(self, clave, valor, generacion: int, ttl: float = None):
+        with self._lock:
+            if generacion != self._generacion:
+                return
+            self._datos[clave] = (time.monotonic() + (self.ttl if ttl is None else ttl), valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_items:
+                self._datos.popitem(last=False)
+
+    def delete(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def descartar(self, clave):
+        # Como invalidar() para las lecturas en curso, pero solo borra esta clave
+        with self._lock:
+            self._generacion += 1
+            self._datos.pop(clave, None)
+
+    def invalidar(self):
+        with self._lock:
+            self._generacion += 1
+            self._datos.clear()
+            self.invalidaciones += 1
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "backend": "memoria",
+                "items": len(self._datos),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidaciones": self.invalidaciones,
+            }
+
+
+class CacheRedis:
+    # Cache compartida entre workers en un servidor compatible con Redis. La
+    # generacion vive en Redis, asi que invalidar en un worker invalida en todos
+    def __init__(self, url: str, prefijo: str, ttl: float = 30.0):
+        import redis
+
+        self.cliente = redis.Redis.from_url(url)
+        self.prefijo = prefijo
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidaciones = 0
+
+    def _contar(self, atributo):
+        with self._lock:
+            setattr(self, atributo, getattr(self, atributo) + 1)
+
+    def generacion(self):
+        return int(self.cliente.get(f"{self.prefijo}:generacion") or 0)
+
+    def get(self, clave):
+        valor = self.cliente.get(f"{self.prefijo}:{self.generacion()}:{clave}")
+        if valor is None:
+            self._contar("misses")
+            return False, None
+        self._contar("hits")
+        return True, pickle.loads(valor)
+
+    def set(self, clave, valor, generacion: int, ttl: float = None):
+        # Las claves de generaciones anteriores dejan de leerse y caducan solas
+        self.cliente.set(
+            f"{self.prefijo}:{generacion}:{clave}", pickle.dumps(valor),
+            px=int((self.ttl if ttl is None else ttl) * 1000)
+        )
+
+    def delete(self, clave):
+        self.cliente.delete(f"{self.prefijo}:{self.generacion()}:{clave}")
+
+    def descartar(self, clave):
+        # Como en CacheLRU hay que subir la generacion: una lectura de otro
+        # worker que empezo antes del cambio guardaria el valor viejo tras el
+        # borrado. Al ir la generacion en la clave se vacia toda esta cache
+        self.cliente.incr(f"{self.prefijo}:generacion")
+
+    def invalidar(self):
+        self.cliente.incr(f"{self.prefijo}:generacion")
+        self._contar("invalidaciones")
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "backend": "redis",
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidaciones": self.invalidaciones,
+            }
+
+
+class CacheNula:
+    # Sin cache: cada lectura va a la base de datos. Sirve para medir lo que
+    # aporta la cache con la misma configuracion en lo demas
+    def __init__(self):
+        self.misses = 0
+        self.invalidaciones = 0
+
+    def generacion(self):
+        return 0
+
+    def get(self, clave):
+        self.misses += 1
+        return False, None
+
+    def set(self, clave, valor, generacion: int, ttl: float = None):
+        pass
+
+    def delete(self, clave):
+        pass
+
+    def descartar(self, clave):
+        pass
+
+    def invalidar(self):
+        self.invalidaciones += 1
+
+    def estadisticas(self):
+        return {
+            "backend": "ninguna",
+            "items": 0,
+            "hits": 0,
+            "misses": self.misses,
+            "invalidaciones": self.invalidaciones,
+        }
+
+
+def crear_cache(nombre: str):
+    if settings.cache_backend == "ninguna":
+        return CacheNula()
+    if settings.cache_backend == "redis":
+        return CacheRedis(settings.redis_url, f"vestibox:{nombre}", ttl=settings.cache_ttl)
+    return CacheLRU(max_items=settings.cache_max_items, ttl=settings.cache_ttl)
+
+# Catalogo de productos: GET /productos/ y GET /productos/{id}
+catalogo = crear_cache("catalogo")
+
+# Clientes por email, tambien los que no existen (GET /clientes/?email=)
+clientes = crear_cache("clientes")
@@ -1,52 +1,365 @@
-from sqlalchemy.orm import Session
-from datetime import datetime
-import models, schemas
+from sqlalchemy import and_, or_, case, delete, func, insert, select, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, selectinload, joinedload
+from datetime import date, datetime, timedelta
+import base64
+import hashlib
+import json
+import logging
+import busqueda, cache, idempotencia, models, precios, reportes, schemas, tareas
+from config import settings
+
+# Estrategias de carga para las lineas de detalle de alquileres y ventas
+ESTRATEGIAS_CARGA = {
+    "selectin": selectinload,
+    "joined": joinedload,
+}
+
+def _cargar_detalles(relacion, carga: str = "selectin"):
+    return ESTRATEGIAS_CARGA[carga](relacion)
+
+# Cursores opacos para paginacion por clave (?after=<token>)
+def codificar_cursor(*valores):
+    datos = [v.isoformat() if isinstance(v, datetime) else v for v in valores]
+    token = base64.urlsafe_b64encode(json.dumps(datos, separators=(",", ":")).encode())
+    return token.decode().rstrip("=")
+
+def decodificar_cursor(token: str, claves: int):
+    # Lanza ValueError si el token no es un cursor valido
+    try:
+        relleno = "=" * (-len(token) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(token + relleno))
+    except (ValueError, TypeError):
+        raise ValueError("Cursor inválido")
+    if not isinstance(valores, list) or len(valores) != claves:
+        raise ValueError("Cursor inválido")
+    return valores
+
+def _despues_de_id(columna_id, after: str):
+    (ultimo_id,) = decodificar_cursor(after, 1)
+    if not isinstance(ultimo_id, int):
+        raise ValueError("Cursor inválido")
+    return columna_id > ultimo_id
+
+def _despues_de_cliente_fecha(columna_cliente, columna_fecha, columna_id, after: str):
+    # Orden (id_cliente ASC, fecha DESC, id DESC)
+    id_cliente, fecha, ultimo_id = decodificar_cursor(after, 3)
+    if not isinstance(id_cliente, int) or not isinstance(ultimo_id, int) or not isinstance(fecha, str):
+        raise ValueError("Cursor inválido")
+    fecha = datetime.fromisoformat(fecha)
+    return or_(
+        columna_cliente > id_cliente,
+        and_(
+            columna_cliente == id_cliente,
+            or_(
+                columna_fecha < fecha,
+                and_(columna_fecha == fecha, columna_id < ultimo_id)
+            )
+        )
+    )
+
+# Cabecera con el cursor de la siguiente pagina
+CABECERA_CURSOR = "X-Next-Cursor"
+
+def cursor_siguiente(items, cursor, limit: int):
+    # Solo hay pagina siguiente si la actual vino completa
+    if items and len(items) == limit:
+        return cursor(items[-1])
+    return None
+
+def cursor_cliente(cliente: models.Cliente):
+    return codificar_cursor(cliente.id)
+
+def cursor_producto(producto: models.Producto):
+    return codificar_cursor(producto.id)
+
+def cursor_alquiler(alquiler: models.Alquiler):
+    return codificar_cursor(alquiler.id_cliente, alquiler.fecha_creacion, alquiler.id)
+
+def cursor_venta(venta: models.Venta):
+    return codificar_cursor(venta.id_cliente, venta.fecha_venta, venta.id)
+
+def cursor_alquiler_fila(alquiler: dict):
+    return codificar_cursor(alquiler["id_cliente"], alquiler["fecha_creacion"], alquiler["id"])
+
+def cursor_venta_fila(venta: dict):
+    return codificar_cursor(venta["id_cliente"], venta["fecha_venta"], venta["id"])
+
+# Listados como diccionarios para la serializacion rapida (ver serializacion.py):
+# se leen solo las columnas del esquema, como filas y sin pasar por el identity
+# map, y las lineas de detalle de toda la pagina con un unico IN
+def _consulta_filas(db: Session, modelo, esquema):
+    return db.query(*[getattr(modelo, campo) for campo in esquema.model_fields if campo != "detalles"])
+
+def _filas_con_detalles(db: Session, query, modelo_detalle, clave: str, esquema_detalle):
+    filas = [fila._asdict() for fila in query]
+    if not filas:
+        return filas
+    por_id = {}
+    for fila in filas:
+        fila["detalles"] = []
+        por_id[fila["id"]] = fila["detalles"]
+    columna_clave = getattr(modelo_detalle, clave)
+    detalles = db.query(*[getattr(modelo_detalle, campo) for campo in esquema_detalle.model_fields])\
+        .filter(columna_clave.in_(list(por_id)))\
+        .order_by(modelo_detalle.id)
+    for detalle in detalles:
+        detalle = detalle._asdict()
+        por_id[detalle[clave]].append(detalle)
+    return filas
+
+class StockInsuficienteError(Exception):
+    def __init__(self, productos):
+        self.productos = productos
+        super().__init__(f"Stock insuficiente para los productos: {productos}")
+
+class PedidoInvalidoError(Exception):
+    # Lineas de un pedido que no se pueden servir (producto inexistente, sin
+    # precio valido o con mas unidades que el stock), con el formato de los
+    # errores de validacion de FastAPI
+    def __init__(self, errores):
+        self.errores = errores
+        super().__init__("; ".join(f"Linea {error['loc'][2]}: {error['msg']}" for error in errores))
+
+class EmailRegistradoError(Exception):
+    def __init__(self, email):
+        self.email = email
+        super().__init__("Email ya registrado")
 
 # Cliente CRUD
 def get_cliente(db: Session, cliente_id: int):
     return db.query(models.Cliente).filter(models.Cliente.id == cliente_id).first()
 
+def _clave_email(email: str):
+    # En minusculas para que el alta de un email descarte tambien las
+    # busquedas fallidas con otras mayusculas (MySQL compara sin distinguirlas)
+    return f"email:{email.lower()}"
+
 def get_cliente_by_email(db: Session, email: str):
-    return db.query(models.Cliente).filter(models.Cliente.email == email).first()
+    # Servido desde cache.clientes, incluidos los emails sin cliente; devuelve
+    # un esquema, como las lecturas del catalogo. Se guarda el email buscado
+    # para no responder a otra variante de mayusculas con su resultado
+    clave = _clave_email(email)
+    encontrado, entrada = cache.clientes.get(clave)
+    if encontrado and entrada[0] == email:
+        return entrada[1]
+    generacion = cache.clientes.generacion()
+    cliente = db.query(models.Cliente).filter(models.Cliente.email == email).first()
+    cliente = schemas.Cliente.model_validate(cliente) if cliente else None
+    # Los emails sin cliente caducan antes (ver settings.cache_ttl_negativo)
+    cache.clientes.set(clave, (email, cliente), generacion, None if cliente else settings.cache_ttl_negativo)
+    return cliente
+
+def get_clientes(db: Session, skip: int = 0, limit: int = 100, after: str = None):
+    query = db.query(models.Cliente).order_by(models.Cliente.id)
+    if after:
+        query = query.filter(_despues_de_id(models.Cliente.id, after))
+    else:
+        query = query.offset(skip)
+    return query.limit(limit).all()
 
-def get_clientes(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Cliente).offset(skip).limit(limit).all()
+def _confirmar_cliente(db: Session, email: str):
+    # La restriccion unique de email decide si ya existe, sin consultarlo antes
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise EmailRegistradoError(email)
 
 def create_cliente(db: Session, cliente: schemas.ClienteCreate):
     db_cliente = models.Cliente(**cliente.dict())
     db.add(db_cliente)
-    db.commit()
+    _confirmar_cliente(db, cliente.email)
+    cache.clientes.descartar(_clave_email(cliente.email))
     db.refresh(db_cliente)
     return db_cliente
 
 def update_cliente(db: Session, cliente_id: int, cliente: schemas.ClienteCreate):
     db_cliente = get_cliente(db, cliente_id)
     if db_cliente:
+        email_anterior = db_cliente.email
         for key, value in cliente.dict().items():
             setattr(db_cliente, key, value)
-        db.commit()
+        _confirmar_cliente(db, cliente.email)
+        cache.clientes.descartar(_clave_email(email_anterior))
+        cache.clientes.descartar(_clave_email(cliente.email))
         db.refresh(db_cliente)
     return db_cliente
 
+def cargar_clientes(db: Session, clientes):
+    # Alta o actualizacion por email de un lote de clientes en un solo INSERT
+    filas = {}
+    for cliente in clientes:
+        filas[cliente.email] = {**cliente.dict(), "activo": True, "fecha_creacion": datetime.utcnow()}
+    _upsert(db, models.Cliente, list(filas.values()), ["email"], ["nombre", "telefono", "direccion"])
+    db.commit()
+    cache.clientes.invalidar()
+    # Los emails repetidos en el lote cuentan una vez
+    return len(filas)
+
 def delete_cliente(db: Session, cliente_id: int):
     db_cliente = get_cliente(db, cliente_id)
     if db_cliente:
+        email = db_cliente.email
         db.delete(db_cliente)
         db.commit()
+        cache.clientes.descartar(_clave_email(email))
         return True
     return False
 
+# ETags fuertes a partir de (id, version); version se incrementa en cada UPDATE
+def etag(recurso: str, filas):
+    huella = hashlib.sha1(",".join(f"{id_}:{version}" for id_, version in filas).encode())
+    return f'"{recurso}-{huella.hexdigest()}"'
+
+def etag_coincide(if_none_match: str, valor: str):
+    # Comparacion debil de If-None-Match (RFC 9110)
+    if not if_none_match:
+        return False
+    etiquetas = [etiqueta.strip().removeprefix("W/") for etiqueta in if_none_match.split(",")]
+    return "*" in etiquetas or valor in etiquetas
+
+def etag_cliente(db: Session, cliente_id: int):
+    version = db.query(models.Cliente.version).filter(models.Cliente.id == cliente_id).scalar()
+    return None if version is None else etag("cliente", [(cliente_id, version)])
+
+def etag_producto(db: Session, producto_id: int):
+    version = db.query(models.Producto.version).filter(models.Producto.id == producto_id).scalar()
+    return None if version is None else etag("producto", [(producto_id, version)])
+
+def etag_productos(db: Session, skip: int = 0, limit: int = 100, after: str = None, filtros: schemas.FiltroProductos = None):
+    # Misma pagina que get_productos pero leyendo solo (id, version)
+    query = db.query(models.Producto.id, models.Producto.version)
+    return etag("productos", _pagina_productos(db, query, skip, limit, after, filtros))
+
 # Producto CRUD
 def get_producto(db: Session, producto_id: int):
     return db.query(models.Producto).filter(models.Producto.id == producto_id).first()
 
-def get_productos(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Producto).offset(skip).limit(limit).all()
+def _buscar_productos(db: Session, consulta: str):
+    # Condicion de busqueda de texto con el indice FULLTEXT de MySQL. Modo
+    # booleano: todas las palabras obligatorias y como prefijo
+    return mysql.match(
+        models.Producto.nombre, models.Producto.descripcion,
+        against=" ".join(f"+{palabra}*" for palabra in busqueda.terminos(consulta))
+    ).in_boolean_mode()
+
+def _ids_busqueda(db: Session, consulta: str):
+    # Ids de los productos que coinciden segun el indice en memoria (motores
+    # sin FULLTEXT)
+    return busqueda.productos.buscar(consulta, lambda: db.query(
+        models.Producto.id, models.Producto.nombre, models.Producto.descripcion
+    ).all())
+
+def _en_ids(db: Session, ids):
+    if db.get_bind().dialect.name == "sqlite":
+        # Un unico parametro JSON en lugar de uno por id: sin limite de
+        # parametros y sin renderizar miles de literales por consulta
+        ids_json = func.json_each(json.dumps(sorted(ids))).table_valued("value")
+        return models.Producto.id.in_(select(ids_json.c.value))
+    return models.Producto.id.in_(ids)
+
+def _busqueda_en_memoria(db: Session, filtros: schemas.FiltroProductos = None):
+    return (
+        filtros is not None and bool(busqueda.terminos(filtros.q))
+        and db.get_bind().dialect.name != "mysql"
+    )
+
+def _filtrar_productos(db: Session, query, filtros: schemas.FiltroProductos = None):
+    if filtros is None:
+        return query
+    if filtros.talla is not None:
+        query = query.filter(models.Producto.talla == filtros.talla)
+    if filtros.color is not None:
+        query = query.filter(models.Producto.color == filtros.color)
+    if filtros.precio_min is not None:
+        query = query.filter(models.Producto.precio_venta >= filtros.precio_min)
+    if filtros.precio_max is not None:
+        query = query.filter(models.Producto.precio_venta <= filtros.precio_max)
+    if filtros.stock_min is not None:
+        query = query.filter(models.Producto.stock >= filtros.stock_min)
+    if filtros.q and busqueda.terminos(filtros.q) and db.get_bind().dialect.name == "mysql":
+        query = query.filter(_buscar_productos(db, filtros.q))
+    return query
+
+# Coincidencias de la busqueda en memoria a partir de las cuales la pagina se
+# busca recorriendo los ids en orden en lugar de con un IN de todos ellos
+MAX_IDS_BUSQUEDA = 5000
+
+def _pagina_productos(db: Session, query, skip: int = 0, limit: int = 100, after: str = None, filtros: schemas.FiltroProductos = None):
+    # Devuelve las filas de la pagina
+    query = _filtrar_productos(db, query, filtros).order_by(models.Producto.id)
+    if after:
+        query = query.filter(_despues_de_id(models.Producto.id, after))
+        skip = 0
+    if _busqueda_en_memoria(db, filtros):
+        ids = _ids_busqueda(db, filtros.q)
+        if len(ids) > MAX_IDS_BUSQUEDA:
+            # Con muchas coincidencias la pagina aparece tras pocas filas: se
+            # recorren en orden los ids que cumplen el resto de filtros hasta
+            # completarla, en lugar de pasar miles de ids a la consulta
+            ids = _ids_en_orden(db, query, ids, skip + limit)[skip:]
+            return query.filter(_en_ids(db, ids)).all() if ids else []
+        query = query.filter(_en_ids(db, ids))
+    if not after:
+        query = query.offset(skip)
+    return query.limit(limit).all()
+
+def _ids_en_orden(db: Session, query, ids, cuantos: int):
+    elegidos = []
+    consulta = query.with_entities(models.Producto.id).statement
+    with db.execute(consulta, execution_options={"yield_per": 500}) as resultado:
+        for (id_,) in resultado:
+            if id_ in ids:
+                elegidos.append(id_)
+                if len(elegidos) == cuantos:
+                    break
+    return elegidos
+
+def get_productos(db: Session, skip: int = 0, limit: int = 100, after: str = None, filtros: schemas.FiltroProductos = None):
+    return _pagina_productos(db, db.query(models.Producto), skip, limit, after, filtros)
+
+# Lecturas del catalogo servidas desde la cache (ver cache.py); devuelven
+# esquemas en lugar de objetos ORM para poder compartirse entre sesiones
+def get_producto_catalogo(db: Session, producto_id: int, etag_actual: str = None):
+    # etag_actual: el leido de la base de datos al comprobar If-None-Match. Si
+    # no coincide con el de la copia en cache (el producto cambio en otro
+    # worker) se vuelve a leer, para que ETag y cuerpo salgan de la misma version
+    clave = f"producto:{producto_id}"
+    encontrado, producto = cache.catalogo.get(clave)
+    if encontrado and etag_actual is not None and (
+        producto is None or etag("producto", [(producto.id, producto.version)]) != etag_actual
+    ):
+        encontrado = False
+    if not encontrado:
+        generacion = cache.catalogo.generacion()
+        producto = get_producto(db, producto_id)
+        producto = schemas.Producto.model_validate(producto) if producto else None
+        cache.catalogo.set(clave, producto, generacion)
+    return producto
+
+def get_productos_catalogo(db: Session, skip: int = 0, limit: int = 100, after: str = None, filtros: schemas.FiltroProductos = None, etag_actual: str = None):
+    # Como get_producto_catalogo, con el ETag de la pagina (etag_productos)
+    clave = f"productos:{skip}:{limit}:{after}:{filtros.model_dump_json() if filtros else ''}"
+    encontrado, productos = cache.catalogo.get(clave)
+    if encontrado and etag_actual is not None and etag("productos", [(p.id, p.version) for p in productos]) != etag_actual:
+        encontrado = False
+    if not encontrado:
+        generacion = cache.catalogo.generacion()
+        productos = [
+            schemas.Producto.model_validate(producto)
+            for producto in get_productos(db, skip=skip, limit=limit, after=after, filtros=filtros)
+        ]
+        cache.catalogo.set(clave, productos, generacion)
+    return productos
 
 def create_producto(db: Session, producto: schemas.ProductoCreate):
     db_producto = models.Producto(**producto.dict())
     db.add(db_producto)
     db.commit()
+    cache.catalogo.invalidar()
+    busqueda.productos.invalidar()
     db.refresh(db_producto)
     return db_producto
 
@@ -56,218 +369,755 @@ def update_producto(db: Session, producto_id: int, producto: schemas.ProductoCre
         for key, value in producto.dict().items():
             setattr(db_producto, key, value)
         db.commit()
+        cache.catalogo.invalidar()
+        busqueda.productos.invalidar()
         db.refresh(db_producto)
     return db_producto
 
+def cargar_productos(db: Session, productos):
+    # Alta o actualizacion (por id) de un lote de productos en un solo INSERT
+    # Las filas sin columna stock no lo cambian al actualizar (el 0 del
+    # esquema solo vale para los productos nuevos): van en un INSERT aparte
+    columnas = [columna for columna in schemas.ProductoCreate.model_fields]
+    con_stock, sin_stock = [], []
+    for producto in productos:
+        fila = {**producto.dict(), "fecha_creacion": datetime.utcnow()}
+        (con_stock if "stock" in producto.model_fields_set else sin_stock).append(fila)
+    if con_stock:
+        _upsert(db, models.Producto, con_stock, ["id"], columnas)
+    if sin_stock:
+        _upsert(db, models.Producto, sin_stock, ["id"], [columna for columna in columnas if columna != "stock"])
+    db.commit()
+    cache.catalogo.invalidar()
+    busqueda.productos.invalidar()
+    return len(productos)
+
 def delete_producto(db: Session, producto_id: int):
     db_producto = get_producto(db, producto_id)
     if db_producto:
         db.delete(db_producto)
         db.commit()
+        cache.catalogo.invalidar()
+        busqueda.productos.invalidar()
         return True
     return False
 
-def update_stock_producto(db: Session, producto_id: int, cantidad: int):
-    producto = get_producto(db, producto_id)
-    if producto:
-        producto.stock += cantidad
-        db.commit()
-        db.refresh(producto)
-    return producto
+def _cantidades_por_producto(detalles):
+    # Agrupa las cantidades de las lineas por producto
+    cantidades = {}
+    for detalle in detalles:
+        cantidades[detalle.id_producto] = cantidades.get(detalle.id_producto, 0) + detalle.cantidad
+    return cantidades
 
-# Alquiler CRUD
-def create_alquiler(db: Session, alquiler: schemas.AlquilerCreate):
-    # Verificar si existe un alquiler pendiente para este cliente
-    alquiler_existente = db.query(models.Alquiler)\
+def _error_linea(linea: int, campo: str, mensaje: str, tipo: str):
+    return {"loc": ["body", "detalles", linea, campo], "msg": mensaje, "type": tipo}
+
+def cargar_productos_pedido(db: Session, detalles, precio: str, error_stock=StockInsuficienteError):
+    # Productos de todas las lineas de un pedido con un unico IN, validados en
+    # memoria: que existan, que tengan precio (precio_venta o precio_alquiler)
+    # y que el stock cubra las unidades pedidas de cada producto. Devuelve
+    # {id: fila}. Si solo falta stock lanza error_stock (409); si hay lineas
+    # que no se pueden servir nunca, PedidoInvalidoError con todas las lineas
+    cantidades = _cantidades_por_producto(detalles)
+    productos = {
+        fila.id: fila for fila in db.query(
+            models.Producto.id, models.Producto.precio_venta,
+            models.Producto.precio_alquiler, models.Producto.stock
+        ).filter(models.Producto.id.in_(list(cantidades)))
+    }
+    errores, sin_stock = [], set()
+    for linea, detalle in enumerate(detalles):
+        producto = productos.get(detalle.id_producto)
+        if producto is None:
+            errores.append(_error_linea(linea, "id_producto", "Producto no encontrado", "producto_no_encontrado"))
+        elif getattr(producto, precio) is None or getattr(producto, precio) < 0:
+            errores.append(_error_linea(linea, "id_producto", "El producto no tiene un precio válido", "precio_no_valido"))
+        elif cantidades[detalle.id_producto] > (producto.stock or 0):
+            sin_stock.add(detalle.id_producto)
+            errores.append(_error_linea(
+                linea, "cantidad",
+                f"Stock insuficiente: {producto.stock or 0} unidades, {cantidades[detalle.id_producto]} pedidas",
+                "stock_insuficiente"
+            ))
+    if any(error["type"] != "stock_insuficiente" for error in errores):
+        raise PedidoInvalidoError(errores)
+    if sin_stock:
+        raise error_stock(sorted(sin_stock))
+    return productos
+
+def _insert_ignorando(db: Session, modelo):
+    # INSERT que ignora las filas cuya clave primaria ya existe
+    dialecto = db.get_bind().dialect.name
+    if dialecto == "mysql":
+        return insert(modelo).prefix_with("IGNORE")
+    if dialecto == "sqlite":
+        return insert(modelo).prefix_with("OR IGNORE")
+    return postgresql.insert(modelo).on_conflict_do_nothing()
+
+def _upsert(db: Session, modelo, filas, claves, columnas):
+    # INSERT multi-fila que actualiza `columnas` (y version) si la clave ya existe.
+    # Los onupdate de las columnas no se aplican en esta rama, asi que version
+    # se incrementa de forma explicita.
+    tabla = modelo.__table__
+    dialecto = db.get_bind().dialect.name
+    if dialecto == "mysql":
+        stmt = mysql.insert(tabla).values(filas)
+        cambios = {columna: stmt.inserted[columna] for columna in columnas}
+        cambios["version"] = tabla.c.version + 1
+        return db.execute(stmt.on_duplicate_key_update(**cambios))
+    stmt = (sqlite if dialecto == "sqlite" else postgresql).insert(tabla).values(filas)
+    cambios = {columna: stmt.excluded[columna] for columna in columnas}
+    cambios["version"] = tabla.c.version + 1
+    return db.execute(stmt.on_conflict_do_update(index_elements=claves, set_=cambios))
+
+# Disponibilidad de alquileres
+# La ocupacion se guarda por producto y dia en models.OcupacionProducto, de
+# modo que consultar un rango cuesta lo mismo con 10 que con 100k alquileres.
+ESTADOS_SIN_RESERVA = ("devuelto", "cancelado")
+
+class SinDisponibilidadError(Exception):
+    def __init__(self, productos):
+        self.productos = productos
+        super().__init__(f"Sin unidades disponibles en esas fechas para los productos: {productos}")
+
+def _dias(fecha_inicio: datetime, fecha_fin: datetime):
+    inicio, fin = fecha_inicio.date(), fecha_fin.date()
+    return [inicio + timedelta(days=i) for i in range((fin - inicio).days + 1)]
+
+def _reservar_ocupacion(db: Session, cantidades: dict, fecha_inicio: datetime, fecha_fin: datetime):
+    dias = _dias(fecha_inicio, fecha_fin)
+    # Crear los dias que aun no tienen ocupacion
+    db.execute(_insert_ignorando(db, models.OcupacionProducto), [
+        {"id_producto": id_producto, "fecha": dia, "cantidad": 0}
+        for id_producto in cantidades
+        for dia in dias
+    ])
+    # Un unico UPDATE condicional: solo reserva si ningun dia supera el stock
+    requerido = case(cantidades, value=models.OcupacionProducto.id_producto)
+    stock = select(models.Producto.stock)\
+        .where(models.Producto.id == models.OcupacionProducto.id_producto)\
+        .scalar_subquery()
+    resultado = db.execute(
+        update(models.OcupacionProducto)
+        .where(
+            models.OcupacionProducto.id_producto.in_(list(cantidades)),
+            models.OcupacionProducto.fecha.between(dias[0], dias[-1]),
+            models.OcupacionProducto.cantidad + requerido <= stock
+        )
+        .values(cantidad=models.OcupacionProducto.cantidad + requerido)
+        .execution_options(synchronize_session=False)
+    )
+    if resultado.rowcount != len(cantidades) * len(dias):
+        db.rollback()
+        disponibles = set(
+            id_producto for id_producto in cantidades
+            if get_disponibilidad(db, id_producto, dias[0], dias[-1])["disponibles"] >= cantidades[id_producto]
+        )
+        raise SinDisponibilidadError(sorted(set(cantidades) - disponibles))
+
+def _liberar_ocupacion(db: Session, cantidades: dict, fecha_inicio: datetime, fecha_fin: datetime):
+    dias = _dias(fecha_inicio, fecha_fin)
+    db.execute(
+        update(models.OcupacionProducto)
+        .where(
+            models.OcupacionProducto.id_producto.in_(list(cantidades)),
+            models.OcupacionProducto.fecha.between(dias[0], dias[-1])
+        )
+        .values(cantidad=models.OcupacionProducto.cantidad - case(cantidades, value=models.OcupacionProducto.id_producto))
+        .execution_options(synchronize_session=False)
+    )
+
+def _unidades_reservadas():
+    # Maximo de unidades del producto (correlacionado con productos.id)
+    # reservadas por alquileres en un mismo dia, de hoy en adelante. Ventas y
+    # alquileres comparten el stock: una venta solo puede llevarse las
+    # unidades que ningun alquiler futuro tiene reservadas
+    return select(func.coalesce(func.max(models.OcupacionProducto.cantidad), 0))\
+        .where(
+            models.OcupacionProducto.id_producto == models.Producto.id,
+            models.OcupacionProducto.fecha >= date.today()
+        )\
+        .scalar_subquery()
+
+def get_disponibilidad(db: Session, producto_id: int, desde: date, hasta: date):
+    producto = get_producto(db, producto_id)
+    if not producto:
+        return None
+    reservados = db.query(func.max(models.OcupacionProducto.cantidad))\
         .filter(
-            models.Alquiler.id_cliente == alquiler.id_cliente,
-            models.Alquiler.estado == "pendiente"
+            models.OcupacionProducto.id_producto == producto_id,
+            models.OcupacionProducto.fecha.between(desde, hasta)
         )\
-        .first()
+        .scalar() or 0
+    return {
+        "id_producto": producto_id,
+        "desde": desde,
+        "hasta": hasta,
+        "stock": producto.stock,
+        "reservados": reservados,
+        "disponibles": max(producto.stock - reservados, 0),
+    }
 
-    if alquiler_existente:
-        # Actualizar el alquiler existente
-        alquiler_existente.total += alquiler.total
-        
-        # Agregar nuevos detalles al alquiler existente
-        for detalle in alquiler.detalles:
-            nuevo_detalle = models.DetalleAlquiler(
-                id_alquiler=alquiler_existente.id,
-                id_producto=detalle.id_producto,
-                cantidad=detalle.cantidad,
-                precio_unitario=detalle.precio_unitario,
-                subtotal=detalle.subtotal
+# Alquiler CRUD
+def _respuesta_pedido(db: Session, pedido, esquema):
+    # Respuesta serializada para idempotencia; los detalles se recargan porque
+    # los nuevos se insertaron en bloque, sin pasar por la relacion
+    db.expire(pedido, ["detalles"])
+    return esquema.model_validate(pedido).model_dump(mode="json")
+
+def create_alquiler(db: Session, alquiler: schemas.AlquilerCreate, clave_idempotencia: str = None):
+    # Cabecera, detalles y reserva de ocupacion se confirman en una sola transaccion
+    if clave_idempotencia:
+        huella = idempotencia.huella("alquileres", alquiler)
+        guardada = idempotencia.buscar(db, clave_idempotencia, huella)
+        if guardada is not None:
+            return guardada
+    try:
+        if clave_idempotencia:
+            idempotencia.reclamar(db, clave_idempotencia, huella)
+        # Verificar si existe un alquiler pendiente para este cliente
+        db_alquiler = db.query(models.Alquiler)\
+            .filter(
+                models.Alquiler.id_cliente == alquiler.id_cliente,
+                models.Alquiler.estado == "pendiente"
+            )\
+            .first()
+
+        pedido_nuevo = db_alquiler is None
+        # Productos validados e importes calculados en el servidor con las
+        # fechas del alquiler al que se anaden
+        if db_alquiler:
+            fecha_inicio, fecha_fin = db_alquiler.fecha_inicio, db_alquiler.fecha_fin
+        else:
+            fecha_inicio, fecha_fin = alquiler.fecha_inicio, alquiler.fecha_fin
+        productos = cargar_productos_pedido(db, alquiler.detalles, "precio_alquiler", SinDisponibilidadError)
+        detalles, total = precios.tarifar_alquiler(productos, alquiler.detalles, fecha_inicio, fecha_fin)
+        if db_alquiler:
+            # Actualizar el alquiler existente; los nuevos detalles se reservan
+            # en las fechas de ese alquiler
+            db_alquiler.total = models.Alquiler.total + total
+        else:
+            # Si no existe un alquiler pendiente, crear uno nuevo
+            db_alquiler = models.Alquiler(
+                id_cliente=alquiler.id_cliente,
+                fecha_inicio=alquiler.fecha_inicio,
+                fecha_fin=alquiler.fecha_fin,
+                total=total,
+                estado="pendiente"
             )
-            db.add(nuevo_detalle)
-        
-        db.commit()
-        db.refresh(alquiler_existente)
-        return alquiler_existente
-    
-    # Si no existe un alquiler pendiente, crear uno nuevo
-    db_alquiler = models.Alquiler(
-        id_cliente=alquiler.id_cliente,
-        fecha_inicio=alquiler.fecha_inicio,
-        fecha_fin=alquiler.fecha_fin,
-        total=alquiler.total,
-        estado="pendiente"
-    )
-    db.add(db_alquiler)
-    db.commit()
-    db.refresh(db_alquiler)
+            db.add(db_alquiler)
+        # Obtener el id y las fechas del alquiler sin confirmar la transaccion
+        db.flush()
 
-    # Crear los detalles del alquiler
-    for detalle in alquiler.detalles:
-        db_detalle = models.DetalleAlquiler(
-            id_alquiler=db_alquiler.id,
-            id_producto=detalle.id_producto,
-            cantidad=detalle.cantidad,
-            precio_unitario=detalle.precio_unitario,
-            subtotal=detalle.subtotal
+        # Insertar todos los detalles en bloque
+        db.execute(insert(models.DetalleAlquiler), [
+            {
+                "id_alquiler": db_alquiler.id,
+                "id_producto": detalle.id_producto,
+                "cantidad": detalle.cantidad,
+                "precio_unitario": detalle.precio_unitario,
+                "subtotal": detalle.subtotal,
+            }
+            for detalle in detalles
+        ])
+        # Reservar las unidades para las fechas del alquiler
+        _reservar_ocupacion(
+            db, _cantidades_por_producto(detalles),
+            db_alquiler.fecha_inicio, db_alquiler.fecha_fin
         )
-        db.add(db_detalle)
-    
-    db.commit()
+        guardadas = tareas.guardar(db, [
+            ("reportes", reportes.movimiento_alquiler(db_alquiler, detalles, pedido_nuevo=pedido_nuevo)),
+        ])
+        if clave_idempotencia:
+            idempotencia.guardar(db, clave_idempotencia, _respuesta_pedido(db, db_alquiler, schemas.Alquiler))
+        db.commit()
+    except idempotencia.ClaveEnUsoError:
+        # Un reintento concurrente con la misma clave se confirmo primero
+        db.rollback()
+        return idempotencia.buscar(db, clave_idempotencia, huella)
+    except Exception:
+        db.rollback()
+        raise
+    tareas.cola.encolar_guardadas(guardadas)
+
     db.refresh(db_alquiler)
     return db_alquiler
 
-def get_alquiler(db: Session, alquiler_id: int):
-    return db.query(models.Alquiler).filter(models.Alquiler.id == alquiler_id).first()
-
-def get_alquileres(db: Session, skip: int = 0, limit: int = 100):
-    # Obtener alquileres ordenados por cliente y fecha
+def get_alquiler(db: Session, alquiler_id: int, carga: str = "selectin"):
     return db.query(models.Alquiler)\
-        .order_by(models.Alquiler.id_cliente, models.Alquiler.fecha_creacion.desc())\
-        .offset(skip)\
-        .limit(limit)\
-        .all()
+        .options(_cargar_detalles(models.Alquiler.detalles, carga))\
+        .filter(models.Alquiler.id == alquiler_id)\
+        .first()
 
-def get_alquileres_cliente(db: Session, cliente_id: int):
-    # Obtener alquileres de un cliente específico ordenados por fecha
-    return db.query(models.Alquiler)\
-        .filter(models.Alquiler.id_cliente == cliente_id)\
-        .order_by(models.Alquiler.fecha_creacion.desc())\
-        .all()
+def _pagina_alquileres(query, skip: int = 0, limit: int = 100, after: str = None):
+    # Alquileres ordenados por cliente y fecha
+    query = query.order_by(
+        models.Alquiler.id_cliente,
+        models.Alquiler.fecha_creacion.desc(),
+        models.Alquiler.id.desc()
+    )
+    if after:
+        query = query.filter(_despues_de_cliente_fecha(
+            models.Alquiler.id_cliente, models.Alquiler.fecha_creacion, models.Alquiler.id, after
+        ))
+    else:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+def _alquileres_cliente(query, cliente_id: int):
+    # Alquileres de un cliente específico ordenados por fecha
+    return query.filter(models.Alquiler.id_cliente == cliente_id)\
+        .order_by(models.Alquiler.fecha_creacion.desc(), models.Alquiler.id.desc())
+
+def get_alquileres(db: Session, skip: int = 0, limit: int = 100, carga: str = "selectin", after: str = None):
+    query = db.query(models.Alquiler).options(_cargar_detalles(models.Alquiler.detalles, carga))
+    return _pagina_alquileres(query, skip, limit, after).all()
+
+def get_alquileres_cliente(db: Session, cliente_id: int, carga: str = "selectin"):
+    query = db.query(models.Alquiler).options(_cargar_detalles(models.Alquiler.detalles, carga))
+    return _alquileres_cliente(query, cliente_id).all()
+
+def get_alquileres_filas(db: Session, skip: int = 0, limit: int = 100, after: str = None):
+    query = _pagina_alquileres(_consulta_filas(db, models.Alquiler, schemas.Alquiler), skip, limit, after)
+    return _filas_con_detalles(db, query, models.DetalleAlquiler, "id_alquiler", schemas.DetalleAlquiler)
+
+def get_alquileres_cliente_filas(db: Session, cliente_id: int):
+    query = _alquileres_cliente(_consulta_filas(db, models.Alquiler, schemas.Alquiler), cliente_id)
+    return _filas_con_detalles(db, query, models.DetalleAlquiler, "id_alquiler", schemas.DetalleAlquiler)
+
+def _cambiar_estado_alquileres(db: Session, alquileres, nuevo_estado: str):
+    # Un UPDATE para todos los alquileres que cambian de estado. Volver a
+    # reservar es parte del cambio (puede no haber unidades y falla todo el
+    # lote); liberar, informes y avisos se devuelven para encolarlos tras el commit
+    reserva = nuevo_estado not in ESTADOS_SIN_RESERVA
+    cambian = [db_alquiler for db_alquiler in alquileres if db_alquiler.estado != nuevo_estado]
+    reservas, pendientes = {}, []
+    for db_alquiler in cambian:
+        reservaba = db_alquiler.estado not in ESTADOS_SIN_RESERVA
+        cantidades = _cantidades_por_producto(db_alquiler.detalles)
+        if cantidades and reserva and not reservaba:
+            # Las reservas con las mismas fechas se hacen juntas
+            acumuladas = reservas.setdefault((db_alquiler.fecha_inicio, db_alquiler.fecha_fin), {})
+            for id_producto, cantidad in cantidades.items():
+                acumuladas[id_producto] = acumuladas.get(id_producto, 0) + cantidad
+        elif cantidades and reservaba and not reserva:
+            pendientes.append(("ocupacion", _tarea_ocupacion(db_alquiler, cantidades)))
+        signo = reportes.cambio_estado(db_alquiler.estado, nuevo_estado)
+        if signo:
+            pendientes.append(("reportes", reportes.movimiento_alquiler(
+                db_alquiler, db_alquiler.detalles, signo=signo, pedido_nuevo=True
+            )))
+        pendientes.append(("notificacion", {"pedido": "alquiler", "id": db_alquiler.id, "estado": nuevo_estado}))
+    for (fecha_inicio, fecha_fin), cantidades in reservas.items():
+        _reservar_ocupacion(db, cantidades, fecha_inicio, fecha_fin)
+    if cambian:
+        valores = {"estado": nuevo_estado}
+        if nuevo_estado == "devuelto":
+            valores["fecha_devolucion"] = datetime.now()
+        db.execute(
+            update(models.Alquiler)
+            .where(models.Alquiler.id.in_([db_alquiler.id for db_alquiler in cambian]))
+            .values(**valores)
+            .execution_options(synchronize_session=False)
+        )
+    return cambian, pendientes
+
+def _confirmar(db: Session, pendientes):
+    # Commit del cambio de estado junto con las tareas que tocan la base de
+    # datos (ver tareas.guardar) y encolado de todas tras el commit
+    try:
+        guardadas = tareas.guardar(db, pendientes)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    tareas.cola.encolar_guardadas(guardadas)
+
+def _resultado_estado(ids, encontrados, cambian):
+    actualizados = set(pedido.id for pedido in cambian)
+    return {
+        "actualizados": sorted(actualizados),
+        "sin_cambios": sorted(set(pedido.id for pedido in encontrados) - actualizados),
+        "no_encontrados": sorted(set(ids) - set(pedido.id for pedido in encontrados)),
+    }
 
 def update_estado_alquiler(db: Session, alquiler_id: int, nuevo_estado: str):
     db_alquiler = get_alquiler(db, alquiler_id)
     if db_alquiler:
-        db_alquiler.estado = nuevo_estado
-        if nuevo_estado == "devuelto":
-            db_alquiler.fecha_devolucion = datetime.now()
-        db.commit()
+        try:
+            _, pendientes = _cambiar_estado_alquileres(db, [db_alquiler], nuevo_estado)
+        except Exception:
+            db.rollback()
+            raise
+        _confirmar(db, pendientes)
         db.refresh(db_alquiler)
     return db_alquiler
 
+def update_estado_alquileres(db: Session, ids, nuevo_estado: str):
+    # Cambio de estado de muchos alquileres en una sola transaccion
+    alquileres = db.query(models.Alquiler)\
+        .options(selectinload(models.Alquiler.detalles))\
+        .filter(models.Alquiler.id.in_(set(ids)))\
+        .all()
+    try:
+        cambian, pendientes = _cambiar_estado_alquileres(db, alquileres, nuevo_estado)
+    except Exception:
+        db.rollback()
+        raise
+    # Antes del commit: despues los pedidos estan expirados y leer sus ids
+    # volveria a cargar cada uno con sus detalles
+    resultado = _resultado_estado(ids, alquileres, cambian)
+    _confirmar(db, pendientes)
+    return resultado
+
+def _borrar_pedido(db: Session, modelo, modelo_detalle, clave: str, pedido_id: int):
+    # Detalles y cabecera con dos DELETE, sin cargar ni recorrer las lineas en la sesion
+    db.execute(
+        delete(modelo_detalle)
+        .where(getattr(modelo_detalle, clave) == pedido_id)
+        .execution_options(synchronize_session=False)
+    )
+    db.execute(delete(modelo).where(modelo.id == pedido_id).execution_options(synchronize_session=False))
+
 def delete_alquiler(db: Session, alquiler_id: int):
     db_alquiler = get_alquiler(db, alquiler_id)
     if db_alquiler:
-        # Devolver stock de productos
-        for detalle in db_alquiler.detalles:
-            update_stock_producto(db, detalle.id_producto, detalle.cantidad)
-        db.delete(db_alquiler)
-        db.commit()
+        # Liberar las unidades reservadas (los alquileres no descuentan stock)
+        # y descontarlo de los informes, despues del commit
+        pendientes = []
+        cantidades = _cantidades_por_producto(db_alquiler.detalles)
+        if cantidades and db_alquiler.estado not in ESTADOS_SIN_RESERVA:
+            pendientes.append(("ocupacion", _tarea_ocupacion(db_alquiler, cantidades)))
+        if db_alquiler.estado not in reportes.ESTADOS_ANULADOS:
+            pendientes.append(("reportes", reportes.movimiento_alquiler(
+                db_alquiler, db_alquiler.detalles, signo=-1, pedido_nuevo=True
+            )))
+        _borrar_pedido(db, models.Alquiler, models.DetalleAlquiler, "id_alquiler", alquiler_id)
+        _confirmar(db, pendientes)
         return True
     return False
 
+# Exportacion en streaming por lotes de cabeceras con paginacion por clave
+# (id > ultimo ORDER BY id LIMIT lote) y una consulta cabecera+detalles por
+# lote. No depende de cursores de servidor, que mysqlconnector no usa: con
+# yield_per traeria todo el resultado a memoria. Entre lotes se termina la
+# transaccion y la conexion vuelve al pool mientras el cliente lee.
+def _exportar(db: Session, cabecera, detalle, fk_detalle, fecha, desde, hasta, estado, lote):
+    columnas_cabecera = [columna for columna in cabecera.__table__.columns]
+    columnas_detalle = [
+        columna.label(f"detalle_{columna.name}") for columna in detalle.__table__.columns
+        if columna is not fk_detalle.property.columns[0]
+    ]
+    ids = select(cabecera.id).order_by(cabecera.id).limit(lote)
+    if desde:
+        ids = ids.where(fecha >= desde)
+    if hasta:
+        ids = ids.where(fecha < hasta + timedelta(days=1))
+    if estado:
+        ids = ids.where(cabecera.estado == estado)
+
+    ultimo = None
+    while True:
+        siguientes = ids if ultimo is None else ids.where(cabecera.id > ultimo)
+        lote_ids = db.execute(siguientes).scalars().all()
+        if not lote_ids:
+            return
+        filas = db.execute(
+            select(*columnas_cabecera, *columnas_detalle)
+            .outerjoin(detalle, fk_detalle == cabecera.id)
+            .where(cabecera.id.in_(lote_ids))
+            .order_by(cabecera.id, detalle.id)
+        ).mappings().all()
+        db.rollback()
+        actual = None
+        for fila in filas:
+            if actual is None or actual["id"] != fila["id"]:
+                if actual is not None:
+                    yield actual
+                actual = {columna.name: fila[columna.name] for columna in columnas_cabecera}
+                actual["detalles"] = []
+            if fila["detalle_id"] is not None:
+                actual["detalles"].append({
+                    columna.name.removeprefix("detalle_"): fila[columna.name] for columna in columnas_detalle
+                })
+        yield actual
+        if len(lote_ids) < lote:
+            return
+        ultimo = lote_ids[-1]
+
+def exportar_alquileres(db: Session, desde: date = None, hasta: date = None, estado: str = None, lote: int = 1000):
+    # El rango de fechas se aplica a fecha_inicio
+    return _exportar(
+        db, models.Alquiler, models.DetalleAlquiler, models.DetalleAlquiler.id_alquiler,
+        models.Alquiler.fecha_inicio, desde, hasta, estado, lote
+    )
+
+def exportar_ventas(db: Session, desde: date = None, hasta: date = None, estado: str = None, lote: int = 1000):
+    # El rango de fechas se aplica a fecha_venta
+    return _exportar(
+        db, models.Venta, models.DetalleVenta, models.DetalleVenta.id_venta,
+        models.Venta.fecha_venta, desde, hasta, estado, lote
+    )
+
 # Venta CRUD
-def create_venta(db: Session, venta: schemas.VentaCreate):
-    # Verificar si existe una venta pendiente para este cliente
-    venta_existente = db.query(models.Venta)\
-        .filter(
-            models.Venta.id_cliente == venta.id_cliente,
-            models.Venta.estado == "pendiente"
-        )\
-        .first()
+def _descontar_stock(db: Session, cantidades: dict):
+    # Un unico UPDATE condicional para todos los productos de la venta: solo
+    # descuenta si quedan unidades sin reservar para alquileres futuros.
+    # cargar_productos_pedido ya ha comprobado el stock; esto cubre las
+    # reservas y las ventas concurrentes del mismo producto
+    requerido = case(cantidades, value=models.Producto.id)
+    resultado = db.execute(
+        update(models.Producto)
+        .where(models.Producto.id.in_(list(cantidades)), models.Producto.stock >= requerido + _unidades_reservadas())
+        .values(stock=models.Producto.stock - requerido)
+        .execution_options(synchronize_session=False)
+    )
+    if resultado.rowcount != len(cantidades):
+        # Algun producto no existe o no tiene unidades libres suficientes:
+        # deshacer la venta y averiguar cuales fallaron para informarlo
+        db.rollback()
+        suficientes = set(
+            id_producto for id_producto, libres in db.query(models.Producto.id, models.Producto.stock - _unidades_reservadas())
+            .filter(models.Producto.id.in_(list(cantidades)))
+            if libres >= cantidades[id_producto]
+        )
+        raise StockInsuficienteError(sorted(set(cantidades) - suficientes))
 
-    if venta_existente:
-        # Actualizar la venta existente
-        venta_existente.total += venta.total
-        
-        # Agregar nuevos detalles a la venta existente
-        for detalle in venta.detalles:
-            nuevo_detalle = models.DetalleVenta(
-                id_venta=venta_existente.id,
-                id_producto=detalle.id_producto,
-                cantidad=detalle.cantidad,
-                precio_unitario=detalle.precio_unitario,
-                subtotal=detalle.subtotal
+def create_venta(db: Session, venta: schemas.VentaCreate, clave_idempotencia: str = None):
+    # Toda la venta (cabecera, detalles y stock) se confirma en una sola transaccion
+    if clave_idempotencia:
+        huella = idempotencia.huella("ventas", venta)
+        guardada = idempotencia.buscar(db, clave_idempotencia, huella)
+        if guardada is not None:
+            return guardada
+    try:
+        if clave_idempotencia:
+            idempotencia.reclamar(db, clave_idempotencia, huella)
+        # Verificar si existe una venta pendiente para este cliente
+        db_venta = db.query(models.Venta)\
+            .filter(
+                models.Venta.id_cliente == venta.id_cliente,
+                models.Venta.estado == "pendiente"
+            )\
+            .first()
+
+        pedido_nuevo = db_venta is None
+        # Productos validados e importes calculados en el servidor
+        productos = cargar_productos_pedido(db, venta.detalles, "precio_venta")
+        detalles, total = precios.tarifar_venta(productos, venta.detalles)
+        if db_venta:
+            # Actualizar la venta existente
+            db_venta.total = models.Venta.total + total
+        else:
+            # Si no existe una venta pendiente, crear una nueva
+            db_venta = models.Venta(
+                id_cliente=venta.id_cliente,
+                fecha_venta=datetime.now(),
+                total=total,
+                estado="pendiente"
             )
-            db.add(nuevo_detalle)
-            # Actualizar stock del producto
-            update_stock_producto(db, detalle.id_producto, -detalle.cantidad)
-        
+            db.add(db_venta)
+        # Obtener el id de la venta sin confirmar la transaccion
+        db.flush()
+
+        # Insertar todos los detalles en bloque
+        db.execute(insert(models.DetalleVenta), [
+            {
+                "id_venta": db_venta.id,
+                "id_producto": detalle.id_producto,
+                "cantidad": detalle.cantidad,
+                "precio_unitario": detalle.precio_unitario,
+                "subtotal": detalle.subtotal,
+            }
+            for detalle in detalles
+        ])
+        # Actualizar stock de los productos
+        _descontar_stock(db, _cantidades_por_producto(detalles))
+        guardadas = tareas.guardar(db, [
+            ("reportes", reportes.movimiento_venta(db_venta, detalles, pedido_nuevo=pedido_nuevo)),
+            ("catalogo", {}),
+        ])
+        if clave_idempotencia:
+            idempotencia.guardar(db, clave_idempotencia, _respuesta_pedido(db, db_venta, schemas.Venta))
         db.commit()
-        db.refresh(venta_existente)
-        return venta_existente
-    
-    # Si no existe una venta pendiente, crear una nueva
-    db_venta = models.Venta(
-        id_cliente=venta.id_cliente,
-        fecha_venta=datetime.now(),
-        total=venta.total,
-        estado="pendiente"
-    )
-    db.add(db_venta)
-    db.commit()
-    db.refresh(db_venta)
+    except idempotencia.ClaveEnUsoError:
+        # Un reintento concurrente con la misma clave se confirmo primero
+        db.rollback()
+        return idempotencia.buscar(db, clave_idempotencia, huella)
+    except Exception:
+        db.rollback()
+        raise
+    tareas.cola.encolar_guardadas(guardadas)
 
-    # Crear los detalles de la venta
-    for detalle in venta.detalles:
-        db_detalle = models.DetalleVenta(
-            id_venta=db_venta.id,
-            id_producto=detalle.id_producto,
-            cantidad=detalle.cantidad,
-            precio_unitario=detalle.precio_unitario,
-            subtotal=detalle.subtotal
-        )
-        db.add(db_detalle)
-        # Actualizar stock del producto
-        update_stock_producto(db, detalle.id_producto, -detalle.cantidad)
-    
-    db.commit()
     db.refresh(db_venta)
     return db_venta
 
-def get_venta(db: Session, venta_id: int):
-    return db.query(models.Venta).filter(models.Venta.id == venta_id).first()
-
-def get_ventas(db: Session, skip: int = 0, limit: int = 100):
-    # Obtener ventas ordenadas por cliente y fecha
+def get_venta(db: Session, venta_id: int, carga: str = "selectin"):
     return db.query(models.Venta)\
-        .order_by(models.Venta.id_cliente, models.Venta.fecha_venta.desc())\
-        .offset(skip)\
-        .limit(limit)\
-        .all()
+        .options(_cargar_detalles(models.Venta.detalles, carga))\
+        .filter(models.Venta.id == venta_id)\
+        .first()
 
-def get_ventas_cliente(db: Session, cliente_id: int):
-    # Obtener ventas de un cliente específico ordenadas por fecha
-    return db.query(models.Venta)\
-        .filter(models.Venta.id_cliente == cliente_id)\
-        .order_by(models.Venta.fecha_venta.desc())\
-        .all()
+def _pagina_ventas(query, skip: int = 0, limit: int = 100, after: str = None):
+    # Ventas ordenadas por cliente y fecha
+    query = query.order_by(
+        models.Venta.id_cliente,
+        models.Venta.fecha_venta.desc(),
+        models.Venta.id.desc()
+    )
+    if after:
+        query = query.filter(_despues_de_cliente_fecha(
+            models.Venta.id_cliente, models.Venta.fecha_venta, models.Venta.id, after
+        ))
+    else:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+def _ventas_cliente(query, cliente_id: int):
+    # Ventas de un cliente específico ordenadas por fecha
+    return query.filter(models.Venta.id_cliente == cliente_id)\
+        .order_by(models.Venta.fecha_venta.desc(), models.Venta.id.desc())
+
+def get_ventas(db: Session, skip: int = 0, limit: int = 100, carga: str = "selectin", after: str = None):
+    query = db.query(models.Venta).options(_cargar_detalles(models.Venta.detalles, carga))
+    return _pagina_ventas(query, skip, limit, after).all()
+
+def get_ventas_cliente(db: Session, cliente_id: int, carga: str = "selectin"):
+    query = db.query(models.Venta).options(_cargar_detalles(models.Venta.detalles, carga))
+    return _ventas_cliente(query, cliente_id).all()
+
+def get_ventas_filas(db: Session, skip: int = 0, limit: int = 100, after: str = None):
+    query = _pagina_ventas(_consulta_filas(db, models.Venta, schemas.Venta), skip, limit, after)
+    return _filas_con_detalles(db, query, models.DetalleVenta, "id_venta", schemas.DetalleVenta)
+
+def get_ventas_cliente_filas(db: Session, cliente_id: int):
+    query = _ventas_cliente(_consulta_filas(db, models.Venta, schemas.Venta), cliente_id)
+    return _filas_con_detalles(db, query, models.DetalleVenta, "id_venta", schemas.DetalleVenta)
+
+def _cambiar_estado_ventas(db: Session, ventas, nuevo_estado: str):
+    # Un UPDATE para todas las ventas que cambian de estado; informes y avisos
+    # se devuelven para encolarlos tras el commit
+    cambian = [db_venta for db_venta in ventas if db_venta.estado != nuevo_estado]
+    pendientes = []
+    for db_venta in cambian:
+        signo = reportes.cambio_estado(db_venta.estado, nuevo_estado)
+        if signo:
+            pendientes.append(("reportes", reportes.movimiento_venta(
+                db_venta, db_venta.detalles, signo=signo, pedido_nuevo=True
+            )))
+        pendientes.append(("notificacion", {"pedido": "venta", "id": db_venta.id, "estado": nuevo_estado}))
+    if cambian:
+        valores = {"estado": nuevo_estado}
+        if nuevo_estado == "pagado":
+            valores["fecha_pago"] = datetime.now()
+        db.execute(
+            update(models.Venta)
+            .where(models.Venta.id.in_([db_venta.id for db_venta in cambian]))
+            .values(**valores)
+            .execution_options(synchronize_session=False)
+        )
+    return cambian, pendientes
 
 def update_estado_venta(db: Session, venta_id: int, nuevo_estado: str):
     db_venta = get_venta(db, venta_id)
     if db_venta:
-        db_venta.estado = nuevo_estado
-        if nuevo_estado == "pagado":
-            db_venta.fecha_pago = datetime.now()
-        db.commit()
+        try:
+            _, pendientes = _cambiar_estado_ventas(db, [db_venta], nuevo_estado)
+        except Exception:
+            db.rollback()
+            raise
+        _confirmar(db, pendientes)
         db.refresh(db_venta)
     return db_venta
 
+def update_estado_ventas(db: Session, ids, nuevo_estado: str):
+    # Cambio de estado de muchas ventas en una sola transaccion
+    ventas = db.query(models.Venta)\
+        .options(selectinload(models.Venta.detalles))\
+        .filter(models.Venta.id.in_(set(ids)))\
+        .all()
+    try:
+        cambian, pendientes = _cambiar_estado_ventas(db, ventas, nuevo_estado)
+    except Exception:
+        db.rollback()
+        raise
+    # Antes del commit: despues los pedidos estan expirados y leer sus ids
+    # volveria a cargar cada uno con sus detalles
+    resultado = _resultado_estado(ids, ventas, cambian)
+    _confirmar(db, pendientes)
+    return resultado
+
 def delete_venta(db: Session, venta_id: int):
     db_venta = get_venta(db, venta_id)
     if db_venta:
-        # Devolver stock de productos
-        for detalle in db_venta.detalles:
-            update_stock_producto(db, detalle.id_producto, detalle.cantidad)
-        db.delete(db_venta)
-        db.commit()
+        # Devolver el stock (un UPDATE agregado por lote en la cola de tareas) y
+        # descontar la venta de los informes, despues del commit
+        pendientes = [("stock", {"cantidades": sorted(_cantidades_por_producto(db_venta.detalles).items())})]
+        if db_venta.estado not in reportes.ESTADOS_ANULADOS:
+            pendientes.append(("reportes", reportes.movimiento_venta(
+                db_venta, db_venta.detalles, signo=-1, pedido_nuevo=True
+            )))
+        pendientes.append(("catalogo", {}))
+        _borrar_pedido(db, models.Venta, models.DetalleVenta, "id_venta", venta_id)
+        _confirmar(db, pendientes)
         return True
     return False
 
+# Tareas posteriores al commit (ver tareas.py). Los datos se guardan como JSON
+# en tareas_pendientes, asi que las cantidades van como pares [id_producto, cantidad]
+log_notificaciones = logging.getLogger("vestibox.notificaciones")
+
+def _tarea_ocupacion(db_alquiler: models.Alquiler, cantidades: dict):
+    return {
+        "cantidades": sorted(cantidades.items()),
+        "fecha_inicio": db_alquiler.fecha_inicio.isoformat(),
+        "fecha_fin": db_alquiler.fecha_fin.isoformat(),
+    }
+
+@tareas.tarea("reportes")
+def _registrar_reportes(db: Session, movimientos):
+    reportes.registrar(db, movimientos)
+
+@tareas.tarea("stock")
+def _devolver_stock(db: Session, devoluciones):
+    # Todas las devoluciones del lote en un unico UPDATE
+    cantidades = {}
+    for devolucion in devoluciones:
+        for id_producto, cantidad in devolucion["cantidades"]:
+            cantidades[id_producto] = cantidades.get(id_producto, 0) + cantidad
+    if cantidades:
+        db.execute(
+            update(models.Producto)
+            .where(models.Producto.id.in_(list(cantidades)))
+            .values(stock=models.Producto.stock + case(cantidades, value=models.Producto.id))
+            .execution_options(synchronize_session=False)
+        )
+
+@tareas.tarea("ocupacion")
+def _liberar_ocupaciones(db: Session, liberaciones):
+    # Como al reservar, las liberaciones con los mismos dias se suman por
+    # producto y se hacen en un solo UPDATE
+    rangos = {}
+    for liberacion in liberaciones:
+        fecha_inicio = datetime.fromisoformat(liberacion["fecha_inicio"])
+        fecha_fin = datetime.fromisoformat(liberacion["fecha_fin"])
+        acumuladas = rangos.setdefault((fecha_inicio.date(), fecha_fin.date()), ({}, fecha_inicio, fecha_fin))[0]
+        for id_producto, cantidad in liberacion["cantidades"]:
+            acumuladas[id_producto] = acumuladas.get(id_producto, 0) + cantidad
+    for cantidades, fecha_inicio, fecha_fin in rangos.values():
+        _liberar_ocupacion(db, cantidades, fecha_inicio, fecha_fin)
+
+@tareas.tarea("catalogo", sesion=False)
+def _invalidar_catalogo(invalidaciones):
+    # Una sola invalidacion por lote
+    cache.catalogo.invalidar()
+
+@tareas.tarea("notificacion", sesion=False)
+def _notificar(avisos):
+    # Punto de enganche para avisar de los cambios de estado; por ahora solo se registran
+    for aviso in avisos:
+        log_notificaciones.info("%s %s: %s", aviso["pedido"], aviso["id"], aviso["estado"])
+
 # Funciones de utilidad
 def check_stock_disponible(db: Session, producto_id: int, cantidad: int):
     producto = get_producto(db, producto_id)
@@ -0,0 +1,129 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date
+import crud, schemas
+
+# Versiones asincronas de crud.py. Cada una ejecuta la funcion sincrona sobre
+# la conexion del driver asincrono con AsyncSession.run_sync, de modo que la
+# logica de negocio vive en un solo sitio. El resultado se convierte al esquema
+# de respuesta dentro del mismo contexto, donde las relaciones aun pueden
+# cargarse; fuera de el, una carga perezosa fallaria.
+
+async def _ejecutar(db: AsyncSession, esquema, funcion, *args, **kwargs):
+    def _sync(session):
+        resultado = funcion(session, *args, **kwargs)
+        if esquema is None or resultado is None:
+            return resultado
+        if isinstance(resultado, list):
+            return [esquema.model_validate(item) for item in resultado]
+        return esquema.model_validate(resultado)
+    return await db.run_sync(_sync)
+
+# ETags
+async def etag_cliente(db: AsyncSession, cliente_id: int):
+    return await _ejecutar(db, None, crud.etag_cliente, cliente_id)
+
+async def etag_producto(db: AsyncSession, producto_id: int):
+    return await _ejecutar(db, None, crud.etag_producto, producto_id)
+
+async def etag_productos(db: AsyncSession, skip: int = 0, limit: int = 100, after: str = None, filtros: schemas.FiltroProductos = None):
+    return await _ejecutar(db, None, crud.etag_productos, skip=skip, limit=limit, after=after, filtros=filtros)
+
+# Cliente CRUD
+async def get_cliente(db: AsyncSession, cliente_id: int):
+    return await _ejecutar(db, schemas.Cliente, crud.get_cliente, cliente_id)
+
+async def get_cliente_by_email(db: AsyncSession, email: str):
+    return await _ejecutar(db, schemas.Cliente, crud.get_cliente_by_email, email)
+
+async def get_clientes(db: AsyncSession, skip: int = 0, limit: int = 100, after: str = None):
+    return await _ejecutar(db, schemas.Cliente, crud.get_clientes, skip=skip, limit=limit, after=after)
+
+async def create_cliente(db: AsyncSession, cliente: schemas.ClienteCreate):
+    return await _ejecutar(db, schemas.Cliente, crud.create_cliente, cliente)
+
+async def update_cliente(db: AsyncSession, cliente_id: int, cliente: schemas.ClienteCreate):
+    return await _ejecutar(db, schemas.Cliente, crud.update_cliente, cliente_id, cliente)
+
+async def delete_cliente(db: AsyncSession, cliente_id: int):
+    return await _ejecutar(db, None, crud.delete_cliente, cliente_id)
+
+# Producto CRUD
+async def get_producto(db: AsyncSession, producto_id: int):
+    return await _ejecutar(db, schemas.Producto, crud.get_producto, producto_id)
+
+async def get_productos(db: AsyncSession, skip: int = 0, limit: int = 100, after: str = None, filtros: schemas.FiltroProductos = None):
+    return await _ejecutar(db, schemas.Producto, crud.get_productos, skip=skip, limit=limit, after=after, filtros=filtros)
+
+async def get_producto_catalogo(db: AsyncSession, producto_id: int):
+    return await _ejecutar(db, None, crud.get_producto_catalogo, producto_id)
+
+async def get_productos_catalogo(db: AsyncSession, skip: int = 0, limit: int = 100, after: str = None, filtros: schemas.FiltroProductos = None):
+    return await _ejecutar(db, None, crud.get_productos_catalogo, skip=skip, limit=limit, after=after, filtros=filtros)
+
+async def create_producto(db: AsyncSession, producto: schemas.ProductoCreate):
+    return await _ejecutar(db, schemas.Producto, crud.create_producto, producto)
+
+async def update_producto(db: AsyncSession, producto_id: int, producto: schemas.ProductoCreate):
+    return await _ejecutar(db, schemas.Producto, crud.update_producto, producto_id, producto)
+
+async def delete_producto(db: AsyncSession, producto_id: int):
+    return await _ejecutar(db, None, crud.delete_producto, producto_id)
+
+async def get_disponibilidad(db: AsyncSession, producto_id: int, desde: date, hasta: date):
+    return await _ejecutar(db, schemas.Disponibilidad, crud.get_disponibilidad, producto_id, desde, hasta)
+
+# Alquiler CRUD
+async def create_alquiler(db: AsyncSession, alquiler: schemas.AlquilerCreate, clave_idempotencia: str = None):
+    return await _ejecutar(db, schemas.Alquiler, crud.create_alquiler, alquiler, clave_idempotencia=clave_idempotencia)
+
+async def get_alquiler(db: AsyncSession, alquiler_id: int, carga: str = "selectin"):
+    return await _ejecutar(db, schemas.Alquiler, crud.get_alquiler, alquiler_id, carga=carga)
+
+async def get_alquileres(db: AsyncSession, skip: int = 0, limit: int = 100, carga: str = "selectin", after: str = None):
+    return await _ejecutar(db, schemas.Alquiler, crud.get_alquileres, skip=skip, limit=limit, carga=carga, after=after)
+
+async def get_alquileres_cliente(db: AsyncSession, cliente_id: int, carga: str = "selectin"):
+    return await _ejecutar(db, schemas.Alquiler, crud.get_alquileres_cliente, cliente_id, carga=carga)
+
+async def get_alquileres_filas(db: AsyncSession, skip: int = 0, limit: int = 100, after: str = None):
+    return await _ejecutar(db, None, crud.get_alquileres_filas, skip=skip, limit=limit, after=after)
+
+async def get_alquileres_cliente_filas(db: AsyncSession, cliente_id: int):
+    return await _ejecutar(db, None, crud.get_alquileres_cliente_filas, cliente_id)
+
+async def update_estado_alquiler(db: AsyncSession, alquiler_id: int, nuevo_estado: str):
+    return await _ejecutar(db, schemas.Alquiler, crud.update_estado_alquiler, alquiler_id, nuevo_estado)
+
+async def update_estado_alquileres(db: AsyncSession, ids, nuevo_estado: str):
+    return await _ejecutar(db, None, crud.update_estado_alquileres, ids, nuevo_estado)
+
+async def delete_alquiler(db: AsyncSession, alquiler_id: int):
+    return await _ejecutar(db, None, crud.delete_alquiler, alquiler_id)
+
+# Venta CRUD
+async def create_venta(db: AsyncSession, venta: schemas.VentaCreate, clave_idempotencia: str = None):
+    return await _ejecutar(db, schemas.Venta, crud.create_venta, venta, clave_idempotencia=clave_idempotencia)
+
+async def get_venta(db: AsyncSession, venta_id: int, carga: str = "selectin"):
+    return await _ejecutar(db, schemas.Venta, crud.get_venta, venta_id, carga=carga)
+
+async def get_ventas(db: AsyncSession, skip: int = 0, limit: int = 100, carga: str = "selectin", after: str = None):
+    return await _ejecutar(db, schemas.Venta, crud.get_ventas, skip=skip, limit=limit, carga=carga, after=after)
+
+async def get_ventas_cliente(db: AsyncSession, cliente_id: int, carga: str = "selectin"):
+    return await _ejecutar(db, schemas.Venta, crud.get_ventas_cliente, cliente_id, carga=carga)
+
+async def get_ventas_filas(db: AsyncSession, skip: int = 0, limit: int = 100, after: str = None):
+    return await _ejecutar(db, None, crud.get_ventas_filas, skip=skip, limit=limit, after=after)
+
+async def get_ventas_cliente_filas(db: AsyncSession, cliente_id: int):
+    return await _ejecutar(db, None, crud.get_ventas_cliente_filas, cliente_id)
+
+async def update_estado_venta(db: AsyncSession, venta_id: int, nuevo_estado: str):
+    return await _ejecutar(db, schemas.Venta, crud.update_estado_venta, venta_id, nuevo_estado)
+
+async def update_estado_ventas(db: AsyncSession, ids, nuevo_estado: str):
+    return await _ejecutar(db, None, crud.update_estado_ventas, ids, nuevo_estado)
+
+async def delete_venta(db: AsyncSession, venta_id: int):
+    return await _ejecutar(db, None, crud.delete_venta, venta_id)
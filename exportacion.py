@@ -0,0 +1,92 @@
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from datetime import date, datetime
+import csv
+import io
+import json
+import crud, models
+from database import SessionLocal
+
+# Exportacion en streaming (GET /ventas/export, GET /alquileres/export) en
+# NDJSON (una cabecera con sus detalles por linea) o CSV (una fila por linea
+# de detalle con los campos de la cabecera repetidos).
+
+# Modelo de cabecera, de detalle y clave foranea de cada exportacion
+EXPORTACIONES = {
+    "ventas": (crud.exportar_ventas, models.Venta, models.DetalleVenta, "id_venta"),
+    "alquileres": (crud.exportar_alquileres, models.Alquiler, models.DetalleAlquiler, "id_alquiler"),
+}
+
+# Tamano aproximado de cada trozo enviado al cliente
+TAMANO_TROZO = 64 * 1024
+
+FORMATOS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+def _json_default(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+def _ndjson(registros):
+    trozo = []
+    tamano = 0
+    for registro in registros:
+        linea = json.dumps(registro, default=_json_default, ensure_ascii=False) + "\n"
+        trozo.append(linea)
+        tamano += len(linea)
+        if tamano >= TAMANO_TROZO:
+            yield "".join(trozo)
+            trozo = []
+            tamano = 0
+    if trozo:
+        yield "".join(trozo)
+
+def _csv(registros, cabecera, detalle, fk_detalle: str):
+    columnas = [columna.name for columna in cabecera.__table__.columns]
+    columnas_detalle = [columna.name for columna in detalle.__table__.columns if columna.name != fk_detalle]
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(columnas + [f"detalle_{columna}" for columna in columnas_detalle])
+    for registro in registros:
+        valores = [_texto(registro[columna]) for columna in columnas]
+        for linea in registro["detalles"] or [{}]:
+            escritor.writerow(valores + [_texto(linea.get(columna)) for columna in columnas_detalle])
+        if buffer.tell() >= TAMANO_TROZO:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def _texto(valor):
+    if valor is None:
+        return ""
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return valor
+
+def exportar(nombre: str, formato: str, **filtros):
+    if formato not in FORMATOS:
+        raise HTTPException(status_code=400, detail=f"Formato no soportado: {formato}")
+    funcion, cabecera, detalle, fk_detalle = EXPORTACIONES[nombre]
+
+    def _registros():
+        # Sesion propia: la respuesta se sigue enviando despues de que la
+        # dependencia get_db haya terminado
+        db = SessionLocal()
+        try:
+            yield from funcion(db, **filtros)
+        finally:
+            db.close()
+
+    if formato == "ndjson":
+        cuerpo = _ndjson(_registros())
+    else:
+        cuerpo = _csv(_registros(), cabecera, detalle, fk_detalle)
+    return StreamingResponse(
+        cuerpo,
+        media_type=FORMATOS[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nombre}.{formato}"'},
+    )
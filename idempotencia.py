@@ -0,0 +1,88 @@
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+import hashlib
+import json
+import threading
+import time
+from config import settings
+import models
+
+# Cabecera Idempotency-Key en POST /ventas/ y POST /alquileres/. La clave se
+# reclama con un INSERT al principio de la transaccion del pedido y la
+# respuesta se guarda en la misma transaccion, asi que o se confirman las dos
+# cosas o ninguna. Un reintento con la misma clave devuelve la respuesta
+# guardada sin volver a tocar pedidos ni stock; si llega mientras la peticion
+# original sigue en curso, espera en la clave primaria y despues la lee.
+
+# Segundos minimos entre dos purgas de claves caducadas en un mismo proceso
+INTERVALO_PURGA = 60
+# Longitud maxima aceptada para la cabecera
+MAX_CLAVE = 255
+
+_ultima_purga = 0.0
+_lock_purga = threading.Lock()
+
+class ClaveReutilizadaError(Exception):
+    def __init__(self):
+        super().__init__("La Idempotency-Key ya se usó con una petición distinta")
+
+class ClaveEnUsoError(Exception):
+    # Otra peticion con la misma clave se confirmo antes que esta
+    pass
+
+def _sha256(texto: str):
+    return hashlib.sha256(texto.encode()).hexdigest()
+
+def huella(ruta: str, cuerpo):
+    return _sha256(ruta + "\n" + cuerpo.model_dump_json())
+
+def _limite():
+    return datetime.utcnow() - timedelta(hours=settings.idempotencia_ttl_horas)
+
+def _purgar(db: Session):
+    global _ultima_purga
+    with _lock_purga:
+        if time.monotonic() - _ultima_purga < INTERVALO_PURGA:
+            return
+        _ultima_purga = time.monotonic()
+    # Transaccion propia y corta, fuera de la del pedido
+    db.execute(delete(models.ClaveIdempotencia).where(models.ClaveIdempotencia.fecha_creacion < _limite()))
+    db.commit()
+
+def buscar(db: Session, clave: str, huella_peticion: str):
+    # Respuesta guardada para la clave, o None si no existe o ha caducado
+    _purgar(db)
+    fila = db.query(models.ClaveIdempotencia.huella, models.ClaveIdempotencia.respuesta)\
+        .filter(
+            models.ClaveIdempotencia.clave == _sha256(clave),
+            models.ClaveIdempotencia.fecha_creacion >= _limite()
+        )\
+        .first()
+    if fila is None:
+        return None
+    if fila.huella != huella_peticion:
+        raise ClaveReutilizadaError()
+    return json.loads(fila.respuesta)
+
+def reclamar(db: Session, clave: str, huella_peticion: str):
+    # Debe ser lo primero de la transaccion del pedido
+    clave = _sha256(clave)
+    db.execute(
+        delete(models.ClaveIdempotencia)
+        .where(models.ClaveIdempotencia.clave == clave, models.ClaveIdempotencia.fecha_creacion < _limite())
+    )
+    db.add(models.ClaveIdempotencia(clave=clave, huella=huella_peticion, respuesta=""))
+    try:
+        db.flush()
+    except IntegrityError:
+        raise ClaveEnUsoError()
+
+def guardar(db: Session, clave: str, respuesta: dict):
+    # Respuesta del pedido, justo antes del commit
+    db.execute(
+        update(models.ClaveIdempotencia)
+        .where(models.ClaveIdempotencia.clave == _sha256(clave))
+        .values(respuesta=json.dumps(respuesta, separators=(",", ":")))
+    )
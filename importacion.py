@@ -0,0 +1,111 @@
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+import codecs
+import csv
+import json
+import schemas
+
+# Carga masiva (POST /productos/bulk, POST /clientes/bulk). Acepta un array
+# JSON o, en streaming, NDJSON (una fila por linea) o CSV con cabecera. Las
+# filas se validan con el esquema indicado y se escriben por lotes con la
+# funcion de crud correspondiente, un INSERT multi-fila por lote.
+
+TAMANO_LOTE = 500
+
+TIPOS_NDJSON = ("application/x-ndjson", "application/jsonl", "application/ndjson")
+
+async def _lineas(request: Request):
+    # Decodificador incremental: un caracter de varios bytes puede quedar
+    # partido entre dos trozos
+    decodificador = codecs.getincrementaldecoder("utf-8")()
+    pendiente = ""
+    async for trozo in request.stream():
+        pendiente += decodificador.decode(trozo)
+        *lineas, pendiente = pendiente.split("\n")
+        for linea in lineas:
+            yield linea.rstrip("\r")
+    pendiente += decodificador.decode(b"", final=True)
+    if pendiente:
+        yield pendiente.rstrip("\r")
+
+async def _registros_csv(request: Request):
+    # Une las lineas de un registro con saltos de linea dentro de comillas
+    registro = ""
+    async for linea in _lineas(request):
+        registro = f"{registro}\n{linea}" if registro else linea
+        if registro.count('"') % 2 == 0:
+            yield registro
+            registro = ""
+    if registro:
+        yield registro
+
+async def _filas(request: Request):
+    # Devuelve (numero_de_fila, datos) o (numero_de_fila, error de formato)
+    tipo = request.headers.get("content-type", "application/json").split(";")[0].strip()
+    if tipo in TIPOS_NDJSON:
+        numero = 0
+        async for linea in _lineas(request):
+            if not linea.strip():
+                continue
+            numero += 1
+            try:
+                yield numero, json.loads(linea)
+            except ValueError:
+                yield numero, "JSON inválido"
+    elif tipo == "text/csv":
+        cabecera = None
+        numero = 0
+        async for registro in _registros_csv(request):
+            if not registro.strip():
+                continue
+            valores = next(csv.reader([registro]))
+            if cabecera is None:
+                cabecera = [columna.strip() for columna in valores]
+                continue
+            numero += 1
+            # Las celdas vacias toman el valor por defecto del esquema
+            yield numero, {columna: valor for columna, valor in zip(cabecera, valores) if valor != ""}
+    else:
+        try:
+            datos = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="JSON inválido")
+        if not isinstance(datos, list):
+            raise HTTPException(status_code=400, detail="Se esperaba un array JSON")
+        for numero, datos_fila in enumerate(datos, start=1):
+            yield numero, datos_fila
+
+def _mensajes(error: ValidationError):
+    return [f"{'.'.join(str(parte) for parte in e['loc']) or 'fila'}: {e['msg']}" for e in error.errors()]
+
+async def importar(request: Request, esquema, guardar, db: Session):
+    resultado = schemas.ResultadoCarga(recibidas=0, procesadas=0, errores=[])
+    lote = []
+
+    async def _escribir():
+        try:
+            resultado.procesadas += await run_in_threadpool(guardar, db, [fila for _, fila in lote])
+        except SQLAlchemyError as e:
+            await run_in_threadpool(db.rollback)
+            mensaje = f"Error al guardar el lote: {e.__class__.__name__}"
+            resultado.errores.extend(schemas.ErrorFila(fila=numero, errores=[mensaje]) for numero, _ in lote)
+        lote.clear()
+
+    async for numero, datos in _filas(request):
+        resultado.recibidas += 1
+        if isinstance(datos, str):
+            resultado.errores.append(schemas.ErrorFila(fila=numero, errores=[datos]))
+            continue
+        try:
+            lote.append((numero, esquema.model_validate(datos)))
+        except ValidationError as e:
+            resultado.errores.append(schemas.ErrorFila(fila=numero, errores=_mensajes(e)))
+            continue
+        if len(lote) >= TAMANO_LOTE:
+            await _escribir()
+    if lote:
+        await _escribir()
+    return resultado
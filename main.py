@@ -1,13 +1,59 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, Header, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List
-import crud, models, schemas
-from database import engine, get_db
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from datetime import date
+import asyncio
+import contextlib
+import logging
+import time
+import cache, crud, exportacion, idempotencia, importacion, metricas, models, reportes, schemas, serializacion, tareas
+from config import settings
+from database import DB_ASYNC, al_crear_engine, calentar_pool, calentar_pool_async, estado_pool, get_async_engine, get_db, get_engine
 
-models.Base.metadata.create_all(bind=engine)
+# El esquema lo gestionan las migraciones de Alembic (alembic upgrade head);
+# CREAR_TABLAS=1 crea al importar las tablas que falten, solo para desarrollo
+if settings.crear_tablas:
+    models.Base.metadata.create_all(bind=get_engine())
 
-app = FastAPI(title="Vestibox API")
+log = logging.getLogger("vestibox.arranque")
+
+# Estado de /salud/listo: el worker atiende peticiones desde que arranca y
+# pasa a listo cuando el pool tiene sus conexiones abiertas
+_inicio = time.perf_counter()
+_arranque = {"listo": False, "conexiones": 0, "segundos": None, "error": None}
+
+async def _calentar_pool():
+    espera = 0.5
+    while True:
+        try:
+            conexiones = await run_in_threadpool(calentar_pool)
+            if DB_ASYNC:
+                conexiones += await calentar_pool_async()
+        except Exception as e:
+            _arranque["error"] = f"{type(e).__name__}: {e}"
+            log.warning("Base de datos no disponible; reintento en %.1f s", espera)
+            await asyncio.sleep(espera)
+            espera = min(espera * 2, 30)
+            continue
+        _arranque.update(listo=True, conexiones=conexiones, error=None, segundos=round(time.perf_counter() - _inicio, 3))
+        return
+
+# Al arrancar: calentamiento del pool y cola de tareas posteriores al commit.
+# Al parar: se vacia la cola
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    calentamiento = asyncio.create_task(_calentar_pool())
+    await tareas.cola.iniciar()
+    yield
+    calentamiento.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await calentamiento
+    await tareas.cola.detener(timeout=settings.tareas_timeout_parada)
+
+app = FastAPI(title="Vestibox API", lifespan=lifespan)
 
 # Configurar CORS
 app.add_middleware(
@@ -16,31 +62,113 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Cabeceras de respuesta que el navegador deja leer al cliente
+    expose_headers=[crud.CABECERA_CURSOR, "ETag"],
 )
 
+# Latencia, codigos de estado y sentencias SQL por ruta, servidos en /metrics
+app.add_middleware(metricas.MiddlewareMetricas)
+al_crear_engine(metricas.instrumentar_engine)
+
+def _cursor_siguiente(response: Response, items, cursor, limit: int):
+    siguiente = crud.cursor_siguiente(items, cursor, limit)
+    if siguiente:
+        response.headers[crud.CABECERA_CURSOR] = siguiente
+
+# Exportaciones en streaming; se registran antes que /ventas/{venta_id} y
+# /alquileres/{alquiler_id} (tambien los de rutas_async) para no confundirse con un id
+@app.get("/alquileres/export")
+def export_alquileres(formato: str = "ndjson", desde: Optional[date] = None, hasta: Optional[date] = None, estado: Optional[str] = None):
+    return exportacion.exportar("alquileres", formato, desde=desde, hasta=hasta, estado=estado)
+
+@app.get("/ventas/export")
+def export_ventas(formato: str = "ndjson", desde: Optional[date] = None, hasta: Optional[date] = None, estado: Optional[str] = None):
+    return exportacion.exportar("ventas", formato, desde=desde, hasta=hasta, estado=estado)
+
+# En modo asincrono las lecturas y el checkout se sirven con rutas async def;
+# se registran antes que las sincronas para que tengan prioridad
+if DB_ASYNC:
+    import rutas_async
+    app.include_router(rutas_async.router)
+
+# Estado del pool de conexiones
+@app.get("/salud/pool")
+def read_estado_pool():
+    estado = {"sync": estado_pool()}
+    if DB_ASYNC:
+        estado["async"] = estado_pool(get_async_engine().sync_engine.pool)
+    return estado
+
+# Disponibilidad del worker para el balanceador: 503 hasta que el pool esta caliente
+@app.get("/salud/listo")
+def read_listo(response: Response):
+    if not _arranque["listo"]:
+        response.status_code = 503
+    return _arranque
+
+# Aciertos y fallos de la cache del catalogo
+@app.get("/salud/cache")
+def read_estado_cache():
+    return {"catalogo": cache.catalogo.estadisticas(), "clientes": cache.clientes.estadisticas()}
+
+# Estado de la cola de tareas
+@app.get("/salud/tareas")
+def read_estado_tareas():
+    return {"cola": tareas.cola.estadisticas()}
+
+# Metricas en formato de texto de Prometheus
+@app.get("/metrics")
+def read_metricas():
+    texto = metricas.registro.exponer(
+        metricas.medidores("vestibox_pool", "pool", read_estado_pool(), contadores=("checkouts", "timeouts"))
+        + metricas.medidores("vestibox_cache", "cache", read_estado_cache(), contadores=("hits", "misses", "invalidaciones"))
+        + metricas.medidores("vestibox_tareas", "tareas", read_estado_tareas(), contadores=("completadas", "fallidas", "reintentos", "lotes"))
+    )
+    return Response(content=texto, media_type="text/plain; version=0.0.4")
+
 # Endpoints de Cliente
 @app.post("/clientes/", response_model=schemas.Cliente)
 def create_cliente(cliente: schemas.ClienteCreate, db: Session = Depends(get_db)):
-    db_cliente = crud.get_cliente_by_email(db, email=cliente.email)
-    if db_cliente:
-        raise HTTPException(status_code=400, detail="Email ya registrado")
-    return crud.create_cliente(db=db, cliente=cliente)
+    try:
+        return crud.create_cliente(db=db, cliente=cliente)
+    except crud.EmailRegistradoError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/clientes/bulk", response_model=schemas.ResultadoCarga)
+async def bulk_clientes(request: Request, db: Session = Depends(get_db)):
+    return await importacion.importar(request, schemas.ClienteCreate, crud.cargar_clientes, db)
 
 @app.get("/clientes/", response_model=List[schemas.Cliente])
-def read_clientes(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    clientes = crud.get_clientes(db, skip=skip, limit=limit)
+def read_clientes(response: Response, skip: int = 0, limit: int = 100, after: Optional[str] = None, email: Optional[str] = None, db: Session = Depends(get_db)):
+    if email is not None:
+        # Busqueda por email (cacheada)
+        db_cliente = crud.get_cliente_by_email(db, email=email)
+        return [db_cliente] if db_cliente else []
+    try:
+        clientes = crud.get_clientes(db, skip=skip, limit=limit, after=after)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    _cursor_siguiente(response, clientes, crud.cursor_cliente, limit)
     return clientes
 
 @app.get("/clientes/{cliente_id}", response_model=schemas.Cliente)
-def read_cliente(cliente_id: int, db: Session = Depends(get_db)):
+def read_cliente(response: Response, cliente_id: int, if_none_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    if if_none_match:
+        etag = crud.etag_cliente(db, cliente_id)
+        if etag and crud.etag_coincide(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
     db_cliente = crud.get_cliente(db, cliente_id=cliente_id)
     if db_cliente is None:
         raise HTTPException(status_code=404, detail="Cliente no encontrado")
+    response.headers["ETag"] = crud.etag("cliente", [(db_cliente.id, db_cliente.version)])
     return db_cliente
 
 @app.put("/clientes/{cliente_id}", response_model=schemas.Cliente)
 def update_cliente(cliente_id: int, cliente: schemas.ClienteCreate, db: Session = Depends(get_db)):
-    db_cliente = crud.update_cliente(db, cliente_id, cliente)
+    try:
+        db_cliente = crud.update_cliente(db, cliente_id, cliente)
+    except crud.EmailRegistradoError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if db_cliente is None:
         raise HTTPException(status_code=404, detail="Cliente no encontrado")
     return db_cliente
@@ -57,18 +185,51 @@ def delete_cliente(cliente_id: int, db: Session = Depends(get_db)):
 def create_producto(producto: schemas.ProductoCreate, db: Session = Depends(get_db)):
     return crud.create_producto(db=db, producto=producto)
 
+@app.post("/productos/bulk", response_model=schemas.ResultadoCarga)
+async def bulk_productos(request: Request, db: Session = Depends(get_db)):
+    return await importacion.importar(request, schemas.ProductoCarga, crud.cargar_productos, db)
+
 @app.get("/productos/", response_model=List[schemas.Producto])
-def read_productos(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    productos = crud.get_productos(db, skip=skip, limit=limit)
+def read_productos(response: Response, skip: int = 0, limit: int = 100, after: Optional[str] = None, filtros: schemas.FiltroProductos = Depends(), if_none_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    etag = None
+    try:
+        if if_none_match:
+            # Una consulta de (id, version) decide si la pagina ha cambiado;
+            # si ha cambiado, la cache no puede servir una copia anterior
+            etag = crud.etag_productos(db, skip=skip, limit=limit, after=after, filtros=filtros)
+            if crud.etag_coincide(if_none_match, etag):
+                return Response(status_code=304, headers={"ETag": etag})
+        productos = crud.get_productos_catalogo(db, skip=skip, limit=limit, after=after, filtros=filtros, etag_actual=etag)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    _cursor_siguiente(response, productos, crud.cursor_producto, limit)
+    response.headers["ETag"] = crud.etag("productos", [(p.id, p.version) for p in productos])
     return productos
 
 @app.get("/productos/{producto_id}", response_model=schemas.Producto)
-def read_producto(producto_id: int, db: Session = Depends(get_db)):
-    db_producto = crud.get_producto(db, producto_id=producto_id)
+def read_producto(response: Response, producto_id: int, if_none_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    etag = None
+    if if_none_match:
+        etag = crud.etag_producto(db, producto_id)
+        if etag is None:
+            raise HTTPException(status_code=404, detail="Producto no encontrado")
+        if crud.etag_coincide(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+    db_producto = crud.get_producto_catalogo(db, producto_id=producto_id, etag_actual=etag)
     if db_producto is None:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
+    response.headers["ETag"] = crud.etag("producto", [(db_producto.id, db_producto.version)])
     return db_producto
 
+@app.get("/productos/{producto_id}/disponibilidad", response_model=schemas.Disponibilidad)
+def read_disponibilidad_producto(producto_id: int, desde: date, hasta: date, db: Session = Depends(get_db)):
+    if hasta < desde:
+        raise HTTPException(status_code=400, detail="La fecha 'hasta' no puede ser anterior a 'desde'")
+    disponibilidad = crud.get_disponibilidad(db, producto_id, desde, hasta)
+    if disponibilidad is None:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+    return disponibilidad
+
 @app.put("/productos/{producto_id}", response_model=schemas.Producto)
 def update_producto(producto_id: int, producto: schemas.ProductoCreate, db: Session = Depends(get_db)):
     db_producto = crud.update_producto(db, producto_id, producto)
@@ -85,28 +246,51 @@ def delete_producto(producto_id: int, db: Session = Depends(get_db)):
 
 # Endpoints de Alquiler
 @app.post("/alquileres/", response_model=schemas.Alquiler)
-def create_alquiler(alquiler: schemas.AlquilerCreate, db: Session = Depends(get_db)):
-    return crud.create_alquiler(db=db, alquiler=alquiler)
+def create_alquiler(alquiler: schemas.AlquilerCreate, idempotency_key: Optional[str] = Header(None, max_length=idempotencia.MAX_CLAVE), db: Session = Depends(get_db)):
+    try:
+        return crud.create_alquiler(db=db, alquiler=alquiler, clave_idempotencia=idempotency_key)
+    except crud.SinDisponibilidadError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except crud.PedidoInvalidoError as e:
+        raise HTTPException(status_code=422, detail=e.errores)
+    except idempotencia.ClaveReutilizadaError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
 @app.get("/alquileres/", response_model=List[schemas.Alquiler])
-def read_alquileres(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    alquileres = crud.get_alquileres(db, skip=skip, limit=limit)
-    return alquileres
+def read_alquileres(skip: int = 0, limit: int = 100, after: Optional[str] = None, db: Session = Depends(get_db)):
+    try:
+        alquileres = crud.get_alquileres_filas(db, skip=skip, limit=limit, after=after)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    respuesta = serializacion.respuesta_lista(schemas.Alquiler, alquileres)
+    _cursor_siguiente(respuesta, alquileres, crud.cursor_alquiler_fila, limit)
+    return respuesta
 
 @app.get("/alquileres/{alquiler_id}", response_model=schemas.Alquiler)
 def read_alquiler(alquiler_id: int, db: Session = Depends(get_db)):
-    db_alquiler = crud.get_alquiler(db, alquiler_id=alquiler_id)
+    db_alquiler = crud.get_alquiler(db, alquiler_id=alquiler_id, carga="joined")
     if db_alquiler is None:
         raise HTTPException(status_code=404, detail="Alquiler no encontrado")
     return db_alquiler
 
 @app.put("/alquileres/{alquiler_id}/estado")
 def update_estado_alquiler(alquiler_id: int, estado: str, db: Session = Depends(get_db)):
-    db_alquiler = crud.update_estado_alquiler(db, alquiler_id, estado)
+    try:
+        db_alquiler = crud.update_estado_alquiler(db, alquiler_id, estado)
+    except crud.SinDisponibilidadError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     if db_alquiler is None:
         raise HTTPException(status_code=404, detail="Alquiler no encontrado")
     return db_alquiler
 
+# Cambio de estado de varios alquileres en una sola transaccion (p. ej. cerrar el dia)
+@app.put("/alquileres/estado", response_model=schemas.ResultadoCambioEstado)
+def update_estado_alquileres(cambio: schemas.CambioEstado, db: Session = Depends(get_db)):
+    try:
+        return crud.update_estado_alquileres(db, cambio.ids, cambio.estado)
+    except crud.SinDisponibilidadError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
 @app.delete("/alquileres/{alquiler_id}")
 def delete_alquiler(alquiler_id: int, db: Session = Depends(get_db)):
     success = crud.delete_alquiler(db, alquiler_id)
@@ -116,22 +300,34 @@ def delete_alquiler(alquiler_id: int, db: Session = Depends(get_db)):
 
 @app.get("/alquileres/cliente/{cliente_id}", response_model=List[schemas.Alquiler])
 def read_alquileres_cliente(cliente_id: int, db: Session = Depends(get_db)):
-    alquileres = crud.get_alquileres_cliente(db, cliente_id)
-    return alquileres
+    alquileres = crud.get_alquileres_cliente_filas(db, cliente_id)
+    return serializacion.respuesta_lista(schemas.Alquiler, alquileres)
 
 # Endpoints de Venta
 @app.post("/ventas/", response_model=schemas.Venta)
-def create_venta(venta: schemas.VentaCreate, db: Session = Depends(get_db)):
-    return crud.create_venta(db=db, venta=venta)
+def create_venta(venta: schemas.VentaCreate, idempotency_key: Optional[str] = Header(None, max_length=idempotencia.MAX_CLAVE), db: Session = Depends(get_db)):
+    try:
+        return crud.create_venta(db=db, venta=venta, clave_idempotencia=idempotency_key)
+    except crud.StockInsuficienteError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except crud.PedidoInvalidoError as e:
+        raise HTTPException(status_code=422, detail=e.errores)
+    except idempotencia.ClaveReutilizadaError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
 @app.get("/ventas/", response_model=List[schemas.Venta])
-def read_ventas(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    ventas = crud.get_ventas(db, skip=skip, limit=limit)
-    return ventas
+def read_ventas(skip: int = 0, limit: int = 100, after: Optional[str] = None, db: Session = Depends(get_db)):
+    try:
+        ventas = crud.get_ventas_filas(db, skip=skip, limit=limit, after=after)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    respuesta = serializacion.respuesta_lista(schemas.Venta, ventas)
+    _cursor_siguiente(respuesta, ventas, crud.cursor_venta_fila, limit)
+    return respuesta
 
 @app.get("/ventas/{venta_id}", response_model=schemas.Venta)
 def read_venta(venta_id: int, db: Session = Depends(get_db)):
-    db_venta = crud.get_venta(db, venta_id=venta_id)
+    db_venta = crud.get_venta(db, venta_id=venta_id, carga="joined")
     if db_venta is None:
         raise HTTPException(status_code=404, detail="Venta no encontrada")
     return db_venta
@@ -143,6 +339,11 @@ def update_estado_venta(venta_id: int, estado: str, db: Session = Depends(get_db
         raise HTTPException(status_code=404, detail="Venta no encontrada")
     return db_venta
 
+# Cambio de estado de varias ventas en una sola transaccion
+@app.put("/ventas/estado", response_model=schemas.ResultadoCambioEstado)
+def update_estado_ventas(cambio: schemas.CambioEstado, db: Session = Depends(get_db)):
+    return crud.update_estado_ventas(db, cambio.ids, cambio.estado)
+
 @app.delete("/ventas/{venta_id}")
 def delete_venta(venta_id: int, db: Session = Depends(get_db)):
     success = crud.delete_venta(db, venta_id)
@@ -152,8 +353,29 @@ def delete_venta(venta_id: int, db: Session = Depends(get_db)):
 
 @app.get("/ventas/cliente/{cliente_id}", response_model=List[schemas.Venta])
 def read_ventas_cliente(cliente_id: int, db: Session = Depends(get_db)):
-    ventas = crud.get_ventas_cliente(db, cliente_id)
-    return ventas
+    ventas = crud.get_ventas_cliente_filas(db, cliente_id)
+    return serializacion.respuesta_lista(schemas.Venta, ventas)
+
+# Endpoints de Reportes (leen solo tablas de resumen)
+@app.get("/reportes/ingresos", response_model=List[schemas.IngresoPeriodo])
+def read_reporte_ingresos(periodo: str = "dia", desde: Optional[date] = None, hasta: Optional[date] = None, tipo: Optional[str] = None, db: Session = Depends(get_db)):
+    if periodo not in ("dia", "mes"):
+        raise HTTPException(status_code=400, detail="El periodo debe ser 'dia' o 'mes'")
+    return reportes.get_ingresos(db, periodo=periodo, desde=desde, hasta=hasta, tipo=tipo)
+
+@app.get("/reportes/productos/top", response_model=List[schemas.ProductoTop])
+def read_reporte_top_productos(tipo: str = "venta", orden: str = "unidades", limit: int = 10, db: Session = Depends(get_db)):
+    if tipo not in ("venta", "alquiler") or orden not in ("unidades", "ingresos"):
+        raise HTTPException(status_code=400, detail="tipo debe ser 'venta' o 'alquiler' y orden 'unidades' o 'ingresos'")
+    return reportes.get_top_productos(db, tipo=tipo, orden=orden, limit=limit)
+
+@app.get("/reportes/utilizacion", response_model=List[schemas.UtilizacionProducto])
+def read_reporte_utilizacion(desde: date, hasta: date, agrupar: str = "producto", db: Session = Depends(get_db)):
+    if hasta < desde:
+        raise HTTPException(status_code=400, detail="La fecha 'hasta' no puede ser anterior a 'desde'")
+    if agrupar not in ("producto", "talla", "color"):
+        raise HTTPException(status_code=400, detail="agrupar debe ser 'producto', 'talla' o 'color'")
+    return reportes.get_utilizacion(db, desde, hasta, agrupar=agrupar)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,176 @@
+from contextvars import ContextVar
+from sqlalchemy import event
+import logging
+import threading
+import time
+from config import settings
+
+# Metricas por ruta en formato de texto de Prometheus: histograma de latencia,
+# respuestas por codigo de estado y numero y tiempo de las sentencias SQL que
+# ejecuta cada peticion. Las sentencias se atribuyen a la peticion en curso a
+# traves de una ContextVar, que tambien llega a los hilos del threadpool donde
+# FastAPI ejecuta las rutas sincronas.
+
+logger = logging.getLogger("vestibox.lentas")
+
+# Limites de los buckets de latencia (segundos), los de los clientes de Prometheus
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Longitud maxima de cada sentencia en el log de peticiones lentas
+MAX_SQL_LOG = 500
+
+
+class _Peticion:
+    # Sentencias SQL de una peticion; solo guarda el texto si hay log de lentas
+    def __init__(self, guardar_sql: bool):
+        self.consultas = 0
+        self.segundos_sql = 0.0
+        self.sentencias = [] if guardar_sql else None
+
+_peticion_actual: ContextVar = ContextVar("peticion_actual", default=None)
+
+
+class _Ruta:
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.cuenta = 0
+        self.suma = 0.0
+        self.estados = {}
+        self.consultas = 0
+        self.segundos_sql = 0.0
+
+
+class Registro:
+    def __init__(self):
+        self._rutas = {}
+        self._lock = threading.Lock()
+
+    def observar(self, metodo: str, ruta: str, estado: int, segundos: float, peticion: _Peticion):
+        with self._lock:
+            datos = self._rutas.get((metodo, ruta))
+            if datos is None:
+                datos = self._rutas[(metodo, ruta)] = _Ruta()
+            for posicion, limite in enumerate(BUCKETS):
+                if segundos <= limite:
+                    datos.buckets[posicion] += 1
+            datos.cuenta += 1
+            datos.suma += segundos
+            datos.estados[estado] = datos.estados.get(estado, 0) + 1
+            datos.consultas += peticion.consultas
+            datos.segundos_sql += peticion.segundos_sql
+
+    def exponer(self, medidores=()):
+        # Texto de exposicion de Prometheus; medidores: (nombre, tipo, ayuda, {etiquetas: valor})
+        lineas = [
+            "# HELP vestibox_http_duracion_segundos Latencia de las peticiones por ruta",
+            "# TYPE vestibox_http_duracion_segundos histogram",
+        ]
+        with self._lock:
+            rutas = sorted(self._rutas.items())
+            for (metodo, ruta), datos in rutas:
+                etiquetas = f'metodo="{metodo}",ruta="{ruta}"'
+                for limite, cuenta in zip(BUCKETS, datos.buckets):
+                    lineas.append(f'vestibox_http_duracion_segundos_bucket{{{etiquetas},le="{limite}"}} {cuenta}')
+                lineas.append(f'vestibox_http_duracion_segundos_bucket{{{etiquetas},le="+Inf"}} {datos.cuenta}')
+                lineas.append(f"vestibox_http_duracion_segundos_sum{{{etiquetas}}} {datos.suma}")
+                lineas.append(f"vestibox_http_duracion_segundos_count{{{etiquetas}}} {datos.cuenta}")
+            lineas += [
+                "# HELP vestibox_http_respuestas_total Respuestas por ruta y codigo de estado",
+                "# TYPE vestibox_http_respuestas_total counter",
+            ]
+            for (metodo, ruta), datos in rutas:
+                for estado, cuenta in sorted(datos.estados.items()):
+                    lineas.append(f'vestibox_http_respuestas_total{{metodo="{metodo}",ruta="{ruta}",estado="{estado}"}} {cuenta}')
+            lineas += [
+                "# HELP vestibox_sql_sentencias_total Sentencias SQL ejecutadas por ruta",
+                "# TYPE vestibox_sql_sentencias_total counter",
+            ]
+            for (metodo, ruta), datos in rutas:
+                lineas.append(f'vestibox_sql_sentencias_total{{metodo="{metodo}",ruta="{ruta}"}} {datos.consultas}')
+            lineas += [
+                "# HELP vestibox_sql_segundos_total Tiempo en sentencias SQL por ruta",
+                "# TYPE vestibox_sql_segundos_total counter",
+            ]
+            for (metodo, ruta), datos in rutas:
+                lineas.append(f'vestibox_sql_segundos_total{{metodo="{metodo}",ruta="{ruta}"}} {datos.segundos_sql}')
+        for nombre, tipo, ayuda, valores in medidores:
+            lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} {tipo}"]
+            for etiquetas, valor in valores.items():
+                lineas.append(f"{nombre}{{{etiquetas}}} {valor}" if etiquetas else f"{nombre} {valor}")
+        return "\n".join(lineas) + "\n"
+
+registro = Registro()
+
+
+def medidores(prefijo: str, etiqueta: str, estados, contadores=()):
+    # Convierte {valor_etiqueta: {campo: numero}} (p. ej. estado_pool o las
+    # estadisticas de la cache) en metricas prefijo_campo{etiqueta="..."}
+    metricas = {}
+    for valor_etiqueta, estado in estados.items():
+        for campo, valor in estado.items():
+            if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+                metricas.setdefault(campo, {})[f'{etiqueta}="{valor_etiqueta}"'] = valor
+    return [
+        (
+            f"{prefijo}_{campo}_total" if campo in contadores else f"{prefijo}_{campo}",
+            "counter" if campo in contadores else "gauge",
+            f"{prefijo} {campo}",
+            valores,
+        )
+        for campo, valores in metricas.items()
+    ]
+
+
+def instrumentar_engine(engine):
+    # Cuenta y cronometra las sentencias de la peticion en curso
+    @event.listens_for(engine, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metricas_inicio", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _despues(conn, cursor, statement, parameters, context, executemany):
+        segundos = time.perf_counter() - conn.info["metricas_inicio"].pop()
+        peticion = _peticion_actual.get()
+        if peticion is None:
+            return
+        peticion.consultas += 1
+        peticion.segundos_sql += segundos
+        if peticion.sentencias is not None:
+            peticion.sentencias.append((segundos, statement[:MAX_SQL_LOG]))
+
+
+class MiddlewareMetricas:
+    # Middleware ASGI: mide hasta el final del cuerpo, incluidas las respuestas en streaming
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        umbral = settings.log_peticiones_lentas_ms
+        peticion = _Peticion(guardar_sql=umbral is not None)
+        token = _peticion_actual.set(peticion)
+        estado = 500
+        inicio = time.perf_counter()
+
+        async def enviar(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            segundos = time.perf_counter() - inicio
+            _peticion_actual.reset(token)
+            # Plantilla de la ruta (/productos/{producto_id}) para acotar las etiquetas
+            ruta = getattr(scope.get("route"), "path", "sin_ruta")
+            registro.observar(scope["method"], ruta, estado, segundos, peticion)
+            if umbral is not None and segundos * 1000 >= umbral:
+                logger.warning(
+                    "Peticion lenta %s %s: %.1f ms, %d sentencias SQL (%.1f ms)\n%s",
+                    scope["method"], scope["path"], segundos * 1000, peticion.consultas,
+                    peticion.segundos_sql * 1000,
+                    "\n".join(f"  {s * 1000:.2f} ms  {sql}" for s, sql in peticion.sentencias),
+                )
@@ -0,0 +1,122 @@
+"""esquema inicial
+
+Tablas tal como las creaba models.Base.metadata.create_all() antes de usar
+Alembic. En bases de datos existentes basta con `alembic stamp 0001`.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 10:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'clientes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('nombre', sa.String(length=100), nullable=False),
+        sa.Column('email', sa.String(length=100), nullable=False),
+        sa.Column('telefono', sa.String(length=20), nullable=True),
+        sa.Column('direccion', sa.String(length=200), nullable=True),
+        sa.Column('activo', sa.Boolean(), nullable=True),
+        sa.Column('fecha_creacion', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email'),
+    )
+    op.create_index('ix_clientes_id', 'clientes', ['id'])
+
+    op.create_table(
+        'productos',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('nombre', sa.String(length=100), nullable=False),
+        sa.Column('descripcion', sa.String(length=500), nullable=True),
+        sa.Column('precio_venta', sa.Float(), nullable=False),
+        sa.Column('precio_alquiler', sa.Float(), nullable=False),
+        sa.Column('stock', sa.Integer(), nullable=True),
+        sa.Column('talla', sa.String(length=10), nullable=False),
+        sa.Column('color', sa.String(length=50), nullable=False),
+        sa.Column('fecha_creacion', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_productos_id', 'productos', ['id'])
+
+    op.create_table(
+        'alquileres',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('id_cliente', sa.Integer(), nullable=False),
+        sa.Column('fecha_inicio', sa.DateTime(), nullable=False),
+        sa.Column('fecha_fin', sa.DateTime(), nullable=False),
+        sa.Column('total', sa.Float(), nullable=False),
+        sa.Column('estado', sa.String(length=20), nullable=True),
+        sa.Column('fecha_creacion', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['id_cliente'], ['clientes.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_alquileres_id', 'alquileres', ['id'])
+
+    op.create_table(
+        'detalles_alquiler',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('id_alquiler', sa.Integer(), nullable=False),
+        sa.Column('id_producto', sa.Integer(), nullable=False),
+        sa.Column('cantidad', sa.Integer(), nullable=False),
+        sa.Column('precio_unitario', sa.Float(), nullable=False),
+        sa.Column('subtotal', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['id_alquiler'], ['alquileres.id']),
+        sa.ForeignKeyConstraint(['id_producto'], ['productos.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_detalles_alquiler_id', 'detalles_alquiler', ['id'])
+
+    op.create_table(
+        'ventas',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('id_cliente', sa.Integer(), nullable=False),
+        sa.Column('fecha_venta', sa.DateTime(), nullable=False),
+        sa.Column('total', sa.Float(), nullable=False),
+        sa.Column('estado', sa.String(length=20), nullable=True),
+        sa.Column('fecha_creacion', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['id_cliente'], ['clientes.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_ventas_id', 'ventas', ['id'])
+
+    op.create_table(
+        'detalles_venta',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('id_venta', sa.Integer(), nullable=False),
+        sa.Column('id_producto', sa.Integer(), nullable=False),
+        sa.Column('cantidad', sa.Integer(), nullable=False),
+        sa.Column('precio_unitario', sa.Float(), nullable=False),
+        sa.Column('subtotal', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['id_venta'], ['ventas.id']),
+        sa.ForeignKeyConstraint(['id_producto'], ['productos.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_detalles_venta_id', 'detalles_venta', ['id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_detalles_venta_id', table_name='detalles_venta')
+    op.drop_table('detalles_venta')
+    op.drop_index('ix_ventas_id', table_name='ventas')
+    op.drop_table('ventas')
+    op.drop_index('ix_detalles_alquiler_id', table_name='detalles_alquiler')
+    op.drop_table('detalles_alquiler')
+    op.drop_index('ix_alquileres_id', table_name='alquileres')
+    op.drop_table('alquileres')
+    op.drop_index('ix_productos_id', table_name='productos')
+    op.drop_table('productos')
+    op.drop_index('ix_clientes_id', table_name='clientes')
+    op.drop_table('clientes')
@@ -0,0 +1,42 @@
+"""indices compuestos por cliente
+
+(id_cliente, estado) para la busqueda del pedido pendiente en create_alquiler
+y create_venta, y (id_cliente, fecha DESC, id DESC) para el historial por
+cliente y la paginacion por clave de los listados.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 10:30:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_alquileres_cliente_estado', 'alquileres', ['id_cliente', 'estado'])
+    op.create_index(
+        'ix_alquileres_cliente_fecha', 'alquileres',
+        ['id_cliente', sa.text('fecha_creacion DESC'), sa.text('id DESC')]
+    )
+    op.create_index('ix_ventas_cliente_estado', 'ventas', ['id_cliente', 'estado'])
+    op.create_index(
+        'ix_ventas_cliente_fecha', 'ventas',
+        ['id_cliente', sa.text('fecha_venta DESC'), sa.text('id DESC')]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ventas_cliente_fecha', table_name='ventas')
+    op.drop_index('ix_ventas_cliente_estado', table_name='ventas')
+    op.drop_index('ix_alquileres_cliente_fecha', table_name='alquileres')
+    op.drop_index('ix_alquileres_cliente_estado', table_name='alquileres')
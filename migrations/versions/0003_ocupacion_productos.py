@@ -0,0 +1,55 @@
+"""ocupacion diaria de productos alquilados
+
+Tabla (id_producto, fecha) -> unidades reservadas, rellenada a partir de los
+alquileres existentes que todavia reservan unidades.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 11:00:00
+
+"""
+from datetime import timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    ocupacion = op.create_table(
+        'ocupacion_productos',
+        sa.Column('id_producto', sa.Integer(), nullable=False),
+        sa.Column('fecha', sa.Date(), nullable=False),
+        sa.Column('cantidad', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['id_producto'], ['productos.id']),
+        sa.PrimaryKeyConstraint('id_producto', 'fecha'),
+    )
+
+    # Rellenar con los alquileres que siguen reservando unidades
+    filas = op.get_bind().execute(sa.text(
+        "SELECT a.fecha_inicio, a.fecha_fin, d.id_producto, d.cantidad "
+        "FROM alquileres a JOIN detalles_alquiler d ON d.id_alquiler = a.id "
+        "WHERE a.estado IS NULL OR a.estado NOT IN ('devuelto', 'cancelado')"
+    ))
+    cantidades = {}
+    for fecha_inicio, fecha_fin, id_producto, cantidad in filas:
+        inicio, fin = fecha_inicio.date(), fecha_fin.date()
+        for i in range((fin - inicio).days + 1):
+            clave = (id_producto, inicio + timedelta(days=i))
+            cantidades[clave] = cantidades.get(clave, 0) + cantidad
+    if cantidades:
+        op.bulk_insert(ocupacion, [
+            {'id_producto': id_producto, 'fecha': fecha, 'cantidad': cantidad}
+            for (id_producto, fecha), cantidad in cantidades.items()
+        ])
+
+
+def downgrade() -> None:
+    op.drop_table('ocupacion_productos')
@@ -0,0 +1,31 @@
+"""columna version en productos y clientes
+
+Contador que se incrementa en cada UPDATE; sirve para los ETag de los
+recursos del catalogo y de clientes.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 11:30:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('clientes', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('productos', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('productos', 'version')
+    op.drop_column('clientes', 'version')
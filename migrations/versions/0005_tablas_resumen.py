@@ -0,0 +1,92 @@
+"""tablas de resumen para reportes
+
+resumen_ingresos_dia y resumen_productos, rellenadas a partir de las ventas y
+alquileres existentes que no estan cancelados, e indice por fecha en
+ocupacion_productos para el informe de utilizacion.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 12:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    ingresos = op.create_table(
+        'resumen_ingresos_dia',
+        sa.Column('fecha', sa.Date(), nullable=False),
+        sa.Column('tipo', sa.String(length=10), nullable=False),
+        sa.Column('pedidos', sa.Integer(), nullable=False),
+        sa.Column('unidades', sa.Integer(), nullable=False),
+        sa.Column('ingresos', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('fecha', 'tipo'),
+    )
+    productos = op.create_table(
+        'resumen_productos',
+        sa.Column('id_producto', sa.Integer(), nullable=False),
+        sa.Column('unidades_vendidas', sa.Integer(), nullable=False),
+        sa.Column('ingresos_ventas', sa.Float(), nullable=False),
+        sa.Column('unidades_alquiladas', sa.Integer(), nullable=False),
+        sa.Column('ingresos_alquileres', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['id_producto'], ['productos.id']),
+        sa.PrimaryKeyConstraint('id_producto'),
+    )
+    op.create_index('ix_ocupacion_productos_fecha', 'ocupacion_productos', ['fecha'])
+
+    # Rellenar con el historico que no esta cancelado
+    bind = op.get_bind()
+    por_dia = {}
+    por_producto = {}
+    consultas = (
+        ('venta', "SELECT v.id, v.fecha_venta, d.id_producto, d.cantidad, d.subtotal "
+                  "FROM ventas v JOIN detalles_venta d ON d.id_venta = v.id "
+                  "WHERE v.estado IS NULL OR v.estado <> 'cancelado'"),
+        ('alquiler', "SELECT a.id, a.fecha_creacion, d.id_producto, d.cantidad, d.subtotal "
+                     "FROM alquileres a JOIN detalles_alquiler d ON d.id_alquiler = a.id "
+                     "WHERE a.estado IS NULL OR a.estado <> 'cancelado'"),
+    )
+    for tipo, consulta in consultas:
+        pedidos = {}
+        for id_pedido, fecha, id_producto, cantidad, subtotal in bind.execute(sa.text(consulta)):
+            clave = (fecha.date(), tipo)
+            pedidos.setdefault(clave, set()).add(id_pedido)
+            dia = por_dia.setdefault(clave, {'unidades': 0, 'ingresos': 0.0})
+            dia['unidades'] += cantidad
+            dia['ingresos'] += subtotal
+            producto = por_producto.setdefault(id_producto, {
+                'unidades_vendidas': 0, 'ingresos_ventas': 0.0,
+                'unidades_alquiladas': 0, 'ingresos_alquileres': 0.0,
+            })
+            if tipo == 'venta':
+                producto['unidades_vendidas'] += cantidad
+                producto['ingresos_ventas'] += subtotal
+            else:
+                producto['unidades_alquiladas'] += cantidad
+                producto['ingresos_alquileres'] += subtotal
+        for clave, ids in pedidos.items():
+            por_dia[clave]['pedidos'] = len(ids)
+    if por_dia:
+        op.bulk_insert(ingresos, [
+            {'fecha': fecha, 'tipo': tipo, **valores} for (fecha, tipo), valores in por_dia.items()
+        ])
+    if por_producto:
+        op.bulk_insert(productos, [
+            {'id_producto': id_producto, **valores} for id_producto, valores in por_producto.items()
+        ])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ocupacion_productos_fecha', table_name='ocupacion_productos')
+    op.drop_table('resumen_productos')
+    op.drop_table('resumen_ingresos_dia')
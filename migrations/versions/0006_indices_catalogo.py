@@ -0,0 +1,37 @@
+"""indices para filtrar y buscar en el catalogo
+
+(talla, color), precio_venta y stock para los filtros de GET /productos/, e
+indice FULLTEXT en (nombre, descripcion) para la busqueda de texto en MySQL.
+En otros motores ese indice queda como uno normal y la busqueda usa el
+indice invertido en memoria de busqueda.py.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 12:30:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_productos_talla_color', 'productos', ['talla', 'color'])
+    op.create_index('ix_productos_precio_venta', 'productos', ['precio_venta'])
+    op.create_index('ix_productos_stock', 'productos', ['stock'])
+    op.create_index('ix_productos_texto', 'productos', ['nombre', 'descripcion'], mysql_prefix='FULLTEXT')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_productos_texto', table_name='productos')
+    op.drop_index('ix_productos_stock', table_name='productos')
+    op.drop_index('ix_productos_precio_venta', table_name='productos')
+    op.drop_index('ix_productos_talla_color', table_name='productos')
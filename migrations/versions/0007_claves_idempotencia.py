@@ -0,0 +1,38 @@
+"""claves de idempotencia
+
+Respuestas de POST /ventas/ y POST /alquileres/ por Idempotency-Key, con
+indice por fecha para purgar las caducadas.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 14:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'claves_idempotencia',
+        sa.Column('clave', sa.String(length=64), nullable=False),
+        sa.Column('huella', sa.String(length=64), nullable=False),
+        sa.Column('respuesta', sa.Text(), nullable=False),
+        sa.Column('fecha_creacion', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('clave'),
+    )
+    op.create_index(op.f('ix_claves_idempotencia_fecha_creacion'), 'claves_idempotencia', ['fecha_creacion'])
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_claves_idempotencia_fecha_creacion'), table_name='claves_idempotencia')
+    op.drop_table('claves_idempotencia')
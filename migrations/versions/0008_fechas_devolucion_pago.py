@@ -0,0 +1,31 @@
+"""fechas de devolucion y pago
+
+Columnas que crud ya rellenaba al pasar un alquiler a devuelto o una venta a
+pagado, y que no existian en las tablas.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 15:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('alquileres', sa.Column('fecha_devolucion', sa.DateTime(), nullable=True))
+    op.add_column('ventas', sa.Column('fecha_pago', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('ventas', 'fecha_pago')
+    op.drop_column('alquileres', 'fecha_devolucion')
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Float, Boolean, Date, DateTime, ForeignKey, Index, literal_column
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -13,6 +13,8 @@ class Cliente(Base):
     direccion = Column(String(200))
     activo = Column(Boolean, default=True)
     fecha_creacion = Column(DateTime, default=datetime.utcnow)
+    # Se incrementa en cada UPDATE; base de los ETag de GET /clientes/{id}
+    version = Column(Integer, nullable=False, default=1, server_default="1", onupdate=literal_column("version + 1"))
     
     
     alquileres = relationship("Alquiler", back_populates="cliente")
@@ -30,6 +32,29 @@ class Producto(Base):
     talla = Column(String(10), nullable=False)
     color = Column(String(50), nullable=False)
     fecha_creacion = Column(DateTime, default=datetime.utcnow)
+    # Se incrementa en cada UPDATE (tambien los de stock); base de los ETag del catalogo
+    version = Column(Integer, nullable=False, default=1, server_default="1", onupdate=literal_column("version + 1"))
+
+    # Filtros de GET /productos/; el FULLTEXT sirve la busqueda de texto en MySQL
+    __table_args__ = (
+        Index("ix_productos_talla_color", talla, color),
+        Index("ix_productos_precio_venta", precio_venta),
+        Index("ix_productos_stock", stock),
+        Index("ix_productos_texto", nombre, descripcion, mysql_prefix="FULLTEXT"),
+    )
+
+class OcupacionProducto(Base):
+    __tablename__ = "ocupacion_productos"
+
+    # Unidades de cada producto reservadas por alquileres en cada dia
+    id_producto = Column(Integer, ForeignKey("productos.id"), primary_key=True)
+    fecha = Column(Date, primary_key=True)
+    cantidad = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # Utilizacion de todo el catalogo en un rango de fechas (/reportes/utilizacion)
+        Index("ix_ocupacion_productos_fecha", fecha),
+    )
 
 class Alquiler(Base):
     __tablename__ = "alquileres"
@@ -41,11 +66,19 @@ class Alquiler(Base):
     total = Column(Float, nullable=False)
     estado = Column(String(20), default="pendiente")
     fecha_creacion = Column(DateTime, default=datetime.utcnow)
+    fecha_devolucion = Column(DateTime, nullable=True)
     
     
     cliente = relationship("Cliente", back_populates="alquileres")
     detalles = relationship("DetalleAlquiler", back_populates="alquiler")
 
+    __table_args__ = (
+        # Busqueda del alquiler pendiente del cliente en create_alquiler
+        Index("ix_alquileres_cliente_estado", id_cliente, estado),
+        # Historial por cliente, orden de listado y paginacion por clave
+        Index("ix_alquileres_cliente_fecha", id_cliente, fecha_creacion.desc(), id.desc()),
+    )
+
 class DetalleAlquiler(Base):
     __tablename__ = "detalles_alquiler"
 
@@ -69,11 +102,19 @@ class Venta(Base):
     total = Column(Float, nullable=False)
     estado = Column(String(20), default="pendiente")
     fecha_creacion = Column(DateTime, default=datetime.utcnow)
+    fecha_pago = Column(DateTime, nullable=True)
     
     
     cliente = relationship("Cliente", back_populates="ventas")
     detalles = relationship("DetalleVenta", back_populates="venta")
 
+    __table_args__ = (
+        # Busqueda de la venta pendiente del cliente en create_venta
+        Index("ix_ventas_cliente_estado", id_cliente, estado),
+        # Historial por cliente, orden de listado y paginacion por clave
+        Index("ix_ventas_cliente_fecha", id_cliente, fecha_venta.desc(), id.desc()),
+    )
+
 class DetalleVenta(Base):
     __tablename__ = "detalles_venta"
 
@@ -86,4 +127,51 @@ class DetalleVenta(Base):
     
     
     venta = relationship("Venta", back_populates="detalles")
-    producto = relationship("Producto") 
\ No newline at end of file
+    producto = relationship("Producto")
+
+# Tablas de resumen para /reportes/, mantenidas de forma incremental desde crud
+# (ver reportes.py) para que los cuadros de mando no recorran ventas ni alquileres
+class ResumenIngresosDia(Base):
+    __tablename__ = "resumen_ingresos_dia"
+
+    fecha = Column(Date, primary_key=True)
+    tipo = Column(String(10), primary_key=True)  # "venta" o "alquiler"
+    pedidos = Column(Integer, nullable=False, default=0)
+    unidades = Column(Integer, nullable=False, default=0)
+    ingresos = Column(Float, nullable=False, default=0)
+
+class ResumenProducto(Base):
+    __tablename__ = "resumen_productos"
+
+    id_producto = Column(Integer, ForeignKey("productos.id"), primary_key=True)
+    unidades_vendidas = Column(Integer, nullable=False, default=0)
+    ingresos_ventas = Column(Float, nullable=False, default=0)
+    unidades_alquiladas = Column(Integer, nullable=False, default=0)
+    ingresos_alquileres = Column(Float, nullable=False, default=0)
+
+    producto = relationship("Producto")
+
+# Respuestas de POST /ventas/ y POST /alquileres/ por cabecera Idempotency-Key
+# (ver idempotencia.py); las filas caducan tras settings.idempotencia_ttl_horas
+class ClaveIdempotencia(Base):
+    __tablename__ = "claves_idempotencia"
+
+    # sha256 de la clave enviada por el cliente, de longitud fija
+    clave = Column(String(64), primary_key=True)
+    # sha256 de la ruta y el cuerpo de la peticion original
+    huella = Column(String(64), nullable=False)
+    respuesta = Column(Text, nullable=False)
+    fecha_creacion = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+# Tareas posteriores al commit que tocan la base de datos (stock, ocupacion,
+# informes), escritas en la misma transaccion que el cambio que las origina y
+# borradas en la transaccion que las aplica (ver tareas.py)
+class TareaPendiente(Base):
+    __tablename__ = "tareas_pendientes"
+
+    id = Column(Integer, primary_key=True)
+    nombre = Column(String(50), nullable=False)
+    # JSON con los datos de la tarea
+    datos = Column(Text, nullable=False)
+    intentos = Column(Integer, nullable=False, default=0)
+    fecha_creacion = Column(DateTime, nullable=False, default=datetime.utcnow)
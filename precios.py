@@ -0,0 +1,32 @@
+from datetime import datetime
+import math
+
+# Precios de las lineas y totales de ventas y alquileres, calculados en el
+# servidor. Los precios salen de las filas de producto que crud ya ha leido
+# para validar el pedido (ver crud.cargar_productos_pedido), asi que tarifar
+# no hace ninguna consulta y siempre usa el precio vigente.
+
+def dias_alquiler(fecha_inicio: datetime, fecha_fin: datetime):
+    # Dias facturados: periodos de 24 horas empezados, como minimo uno
+    return max(1, math.ceil((fecha_fin - fecha_inicio).total_seconds() / 86400))
+
+def _tarifar(detalles, precio_unitario):
+    # Importes redondeados a centimos
+    lineas = []
+    for detalle in detalles:
+        precio = round(precio_unitario(detalle.id_producto), 2)
+        lineas.append(detalle.model_copy(update={
+            "precio_unitario": precio,
+            "subtotal": round(precio * detalle.cantidad, 2),
+        }))
+    return lineas, round(sum(linea.subtotal for linea in lineas), 2)
+
+def tarifar_venta(productos, detalles):
+    # Lineas con precio_unitario y subtotal calculados, y total de la venta.
+    # productos: {id: fila con precio_venta y precio_alquiler}
+    return _tarifar(detalles, lambda id_producto: productos[id_producto].precio_venta)
+
+def tarifar_alquiler(productos, detalles, fecha_inicio: datetime, fecha_fin: datetime):
+    # El precio unitario de un alquiler es el precio por dia por los dias facturados
+    dias = dias_alquiler(fecha_inicio, fecha_fin)
+    return _tarifar(detalles, lambda id_producto: productos[id_producto].precio_alquiler * dias)
@@ -0,0 +1,171 @@
+from sqlalchemy import func, insert
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session
+from datetime import date
+import models
+
+# Mantenimiento incremental de las tablas de resumen. crud describe cada
+# cambio como un movimiento y, tras confirmarlo, lo encola en la cola de
+# tareas (ver tareas.py), que aplica los de un lote juntos con registrar. Los
+# informes van unos instantes por detras de los pedidos y la fila del dia ya
+# no se bloquea en cada checkout.
+
+# Estados cuyos pedidos no cuentan en los informes
+ESTADOS_ANULADOS = ("cancelado",)
+
+def _acumular(db: Session, modelo, claves, filas):
+    # INSERT multi-fila que suma los valores a la fila existente con la misma clave
+    tabla = modelo.__table__
+    columnas = [columna for columna in filas[0] if columna not in claves]
+    dialecto = db.get_bind().dialect.name
+    if dialecto == "mysql":
+        stmt = mysql.insert(tabla).values(filas)
+        stmt = stmt.on_duplicate_key_update(**{
+            columna: tabla.c[columna] + stmt.inserted[columna] for columna in columnas
+        })
+    else:
+        stmt = (sqlite if dialecto == "sqlite" else postgresql).insert(tabla).values(filas)
+        stmt = stmt.on_conflict_do_update(index_elements=claves, set_={
+            columna: tabla.c[columna] + stmt.excluded[columna] for columna in columnas
+        })
+    db.execute(stmt)
+
+def registrar(db: Session, movimientos):
+    # Aplica de una vez una lista de movimientos (ver movimiento_venta): dos
+    # INSERT multi-fila en total, sumados por dia y tipo y por producto
+    dias, productos = {}, {}
+    for movimiento in movimientos:
+        signo, tipo = movimiento["signo"], movimiento["tipo"]
+        if not movimiento["lineas"]:
+            continue
+        dia = dias.setdefault((movimiento["fecha"], tipo), [0, 0, 0.0])
+        dia[0] += signo * movimiento["pedidos"]
+        unidades_col, ingresos_col = (
+            ("unidades_vendidas", "ingresos_ventas") if tipo == "venta"
+            else ("unidades_alquiladas", "ingresos_alquileres")
+        )
+        for id_producto, cantidad, subtotal in movimiento["lineas"]:
+            dia[1] += signo * cantidad
+            dia[2] += signo * subtotal
+            producto = productos.setdefault(id_producto, {
+                "id_producto": id_producto,
+                "unidades_vendidas": 0,
+                "ingresos_ventas": 0.0,
+                "unidades_alquiladas": 0,
+                "ingresos_alquileres": 0.0,
+            })
+            producto[unidades_col] += signo * cantidad
+            producto[ingresos_col] += signo * subtotal
+    if not dias:
+        return
+    _acumular(db, models.ResumenIngresosDia, ["fecha", "tipo"], [
+        {"fecha": date.fromisoformat(fecha), "tipo": tipo, "pedidos": pedidos, "unidades": unidades, "ingresos": ingresos}
+        for (fecha, tipo), (pedidos, unidades, ingresos) in sorted(dias.items())
+    ])
+    _acumular(db, models.ResumenProducto, ["id_producto"], [productos[id_producto] for id_producto in sorted(productos)])
+
+def _movimiento(tipo: str, fecha: date, detalles, signo: int, pedido_nuevo: bool):
+    # Serializable a JSON para poder pasar por la cola de tareas
+    return {
+        "tipo": tipo,
+        "fecha": fecha.isoformat(),
+        "lineas": [[detalle.id_producto, detalle.cantidad, detalle.subtotal] for detalle in detalles],
+        "signo": signo,
+        "pedidos": 1 if pedido_nuevo else 0,
+    }
+
+def movimiento_venta(venta: models.Venta, detalles, signo: int = 1, pedido_nuevo: bool = False):
+    # Se contabiliza en el dia de la venta
+    return _movimiento("venta", venta.fecha_venta.date(), detalles, signo, pedido_nuevo)
+
+def movimiento_alquiler(alquiler: models.Alquiler, detalles, signo: int = 1, pedido_nuevo: bool = False):
+    # Se contabiliza en el dia en que se creo el alquiler
+    return _movimiento("alquiler", alquiler.fecha_creacion.date(), detalles, signo, pedido_nuevo)
+
+def cambio_estado(estado_anterior: str, nuevo_estado: str):
+    # +1 si el pedido vuelve a contar, -1 si deja de contar, 0 si no cambia
+    antes = estado_anterior not in ESTADOS_ANULADOS
+    despues = nuevo_estado not in ESTADOS_ANULADOS
+    return int(despues) - int(antes)
+
+# Consultas de los informes (solo leen tablas de resumen)
+def get_ingresos(db: Session, periodo: str = "dia", desde: date = None, hasta: date = None, tipo: str = None):
+    query = db.query(models.ResumenIngresosDia).order_by(models.ResumenIngresosDia.fecha, models.ResumenIngresosDia.tipo)
+    if desde:
+        query = query.filter(models.ResumenIngresosDia.fecha >= desde)
+    if hasta:
+        query = query.filter(models.ResumenIngresosDia.fecha <= hasta)
+    if tipo:
+        query = query.filter(models.ResumenIngresosDia.tipo == tipo)
+    resultado = {}
+    for fila in query:
+        clave = (fila.fecha.isoformat() if periodo == "dia" else fila.fecha.strftime("%Y-%m"), fila.tipo)
+        acumulado = resultado.setdefault(clave, {
+            "periodo": clave[0], "tipo": fila.tipo, "pedidos": 0, "unidades": 0, "ingresos": 0.0
+        })
+        acumulado["pedidos"] += fila.pedidos
+        acumulado["unidades"] += fila.unidades
+        acumulado["ingresos"] += fila.ingresos
+    return list(resultado.values())
+
+def get_top_productos(db: Session, tipo: str = "venta", orden: str = "unidades", limit: int = 10):
+    columnas = {
+        ("venta", "unidades"): models.ResumenProducto.unidades_vendidas,
+        ("venta", "ingresos"): models.ResumenProducto.ingresos_ventas,
+        ("alquiler", "unidades"): models.ResumenProducto.unidades_alquiladas,
+        ("alquiler", "ingresos"): models.ResumenProducto.ingresos_alquileres,
+    }
+    unidades = columnas[(tipo, "unidades")]
+    ingresos = columnas[(tipo, "ingresos")]
+    filas = db.query(
+            models.Producto.id, models.Producto.nombre, models.Producto.talla,
+            models.Producto.color, unidades, ingresos
+        )\
+        .join(models.ResumenProducto, models.ResumenProducto.id_producto == models.Producto.id)\
+        .filter(unidades > 0)\
+        .order_by(columnas[(tipo, orden)].desc(), models.Producto.id)\
+        .limit(limit)\
+        .all()
+    return [
+        {
+            "id_producto": id_producto, "nombre": nombre, "talla": talla, "color": color,
+            "unidades": unidades_fila, "ingresos": ingresos_fila,
+        }
+        for id_producto, nombre, talla, color, unidades_fila, ingresos_fila in filas
+    ]
+
+def get_utilizacion(db: Session, desde: date, hasta: date, agrupar: str = "producto"):
+    # Unidades-dia reservadas frente a unidades-dia disponibles (stock x dias)
+    dias = (hasta - desde).days + 1
+    reservadas = db.query(
+            models.OcupacionProducto.id_producto,
+            func.sum(models.OcupacionProducto.cantidad).label("reservadas")
+        )\
+        .filter(models.OcupacionProducto.fecha.between(desde, hasta))\
+        .group_by(models.OcupacionProducto.id_producto)\
+        .subquery()
+    grupos = {
+        "producto": [models.Producto.id, models.Producto.nombre, models.Producto.talla, models.Producto.color],
+        "talla": [models.Producto.talla],
+        "color": [models.Producto.color],
+    }[agrupar]
+    filas = db.query(
+            *grupos,
+            func.coalesce(func.sum(reservadas.c.reservadas), 0),
+            func.coalesce(func.sum(models.Producto.stock), 0)
+        )\
+        .outerjoin(reservadas, reservadas.c.id_producto == models.Producto.id)\
+        .group_by(*grupos)\
+        .order_by(*grupos)\
+        .all()
+    resultado = []
+    for fila in filas:
+        *claves, unidades_reservadas, stock = fila
+        capacidad = stock * dias
+        resultado.append({
+            **{("id_producto" if columna.key == "id" else columna.key): valor for columna, valor in zip(grupos, claves)},
+            "unidades_dia_reservadas": unidades_reservadas,
+            "unidades_dia_disponibles": capacidad,
+            "utilizacion": unidades_reservadas / capacidad if capacidad else 0.0,
+        })
+    return resultado
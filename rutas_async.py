@@ -0,0 +1,145 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import date
+import crud, crud_async, idempotencia, schemas, serializacion
+from database import get_async_db
+
+# Rutas async def para el modo asincrono (DB_ASYNC=1). Cubren las lecturas y
+# el checkout, que concentran el trafico; el resto sigue en main.py.
+router = APIRouter()
+
+def _cursor_siguiente(response: Response, items, cursor, limit: int):
+    siguiente = crud.cursor_siguiente(items, cursor, limit)
+    if siguiente:
+        response.headers[crud.CABECERA_CURSOR] = siguiente
+
+# Endpoints de Cliente
+@router.get("/clientes/", response_model=List[schemas.Cliente])
+async def read_clientes_async(response: Response, skip: int = 0, limit: int = 100, after: Optional[str] = None, email: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+    if email is not None:
+        # Busqueda por email (cacheada)
+        db_cliente = await crud_async.get_cliente_by_email(db, email=email)
+        return [db_cliente] if db_cliente else []
+    try:
+        clientes = await crud_async.get_clientes(db, skip=skip, limit=limit, after=after)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    _cursor_siguiente(response, clientes, crud.cursor_cliente, limit)
+    return clientes
+
+@router.get("/clientes/{cliente_id}", response_model=schemas.Cliente)
+async def read_cliente_async(response: Response, cliente_id: int, if_none_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_async_db)):
+    if if_none_match:
+        etag = await crud_async.etag_cliente(db, cliente_id)
+        if etag and crud.etag_coincide(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+    db_cliente = await crud_async.get_cliente(db, cliente_id=cliente_id)
+    if db_cliente is None:
+        raise HTTPException(status_code=404, detail="Cliente no encontrado")
+    response.headers["ETag"] = crud.etag("cliente", [(db_cliente.id, db_cliente.version)])
+    return db_cliente
+
+# Endpoints de Producto
+@router.get("/productos/", response_model=List[schemas.Producto])
+async def read_productos_async(response: Response, skip: int = 0, limit: int = 100, after: Optional[str] = None, filtros: schemas.FiltroProductos = Depends(), if_none_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_async_db)):
+    try:
+        if if_none_match:
+            etag = await crud_async.etag_productos(db, skip=skip, limit=limit, after=after, filtros=filtros)
+            if crud.etag_coincide(if_none_match, etag):
+                return Response(status_code=304, headers={"ETag": etag})
+        productos = await crud_async.get_productos_catalogo(db, skip=skip, limit=limit, after=after, filtros=filtros)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    _cursor_siguiente(response, productos, crud.cursor_producto, limit)
+    response.headers["ETag"] = crud.etag("productos", [(p.id, p.version) for p in productos])
+    return productos
+
+@router.get("/productos/{producto_id}", response_model=schemas.Producto)
+async def read_producto_async(response: Response, producto_id: int, if_none_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_async_db)):
+    if if_none_match:
+        etag = await crud_async.etag_producto(db, producto_id)
+        if etag and crud.etag_coincide(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+    db_producto = await crud_async.get_producto_catalogo(db, producto_id=producto_id)
+    if db_producto is None:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+    response.headers["ETag"] = crud.etag("producto", [(db_producto.id, db_producto.version)])
+    return db_producto
+
+@router.get("/productos/{producto_id}/disponibilidad", response_model=schemas.Disponibilidad)
+async def read_disponibilidad_producto_async(producto_id: int, desde: date, hasta: date, db: AsyncSession = Depends(get_async_db)):
+    if hasta < desde:
+        raise HTTPException(status_code=400, detail="La fecha 'hasta' no puede ser anterior a 'desde'")
+    disponibilidad = await crud_async.get_disponibilidad(db, producto_id, desde, hasta)
+    if disponibilidad is None:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+    return disponibilidad
+
+# Endpoints de Alquiler
+@router.post("/alquileres/", response_model=schemas.Alquiler)
+async def create_alquiler_async(alquiler: schemas.AlquilerCreate, idempotency_key: Optional[str] = Header(None, max_length=idempotencia.MAX_CLAVE), db: AsyncSession = Depends(get_async_db)):
+    try:
+        return await crud_async.create_alquiler(db=db, alquiler=alquiler, clave_idempotencia=idempotency_key)
+    except crud.SinDisponibilidadError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except crud.PedidoInvalidoError as e:
+        raise HTTPException(status_code=422, detail=e.errores)
+    except idempotencia.ClaveReutilizadaError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@router.get("/alquileres/", response_model=List[schemas.Alquiler])
+async def read_alquileres_async(skip: int = 0, limit: int = 100, after: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+    try:
+        alquileres = await crud_async.get_alquileres_filas(db, skip=skip, limit=limit, after=after)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    respuesta = serializacion.respuesta_lista(schemas.Alquiler, alquileres)
+    _cursor_siguiente(respuesta, alquileres, crud.cursor_alquiler_fila, limit)
+    return respuesta
+
+@router.get("/alquileres/{alquiler_id}", response_model=schemas.Alquiler)
+async def read_alquiler_async(alquiler_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_alquiler = await crud_async.get_alquiler(db, alquiler_id=alquiler_id, carga="joined")
+    if db_alquiler is None:
+        raise HTTPException(status_code=404, detail="Alquiler no encontrado")
+    return db_alquiler
+
+@router.get("/alquileres/cliente/{cliente_id}", response_model=List[schemas.Alquiler])
+async def read_alquileres_cliente_async(cliente_id: int, db: AsyncSession = Depends(get_async_db)):
+    alquileres = await crud_async.get_alquileres_cliente_filas(db, cliente_id)
+    return serializacion.respuesta_lista(schemas.Alquiler, alquileres)
+
+# Endpoints de Venta
+@router.post("/ventas/", response_model=schemas.Venta)
+async def create_venta_async(venta: schemas.VentaCreate, idempotency_key: Optional[str] = Header(None, max_length=idempotencia.MAX_CLAVE), db: AsyncSession = Depends(get_async_db)):
+    try:
+        return await crud_async.create_venta(db=db, venta=venta, clave_idempotencia=idempotency_key)
+    except crud.StockInsuficienteError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except crud.PedidoInvalidoError as e:
+        raise HTTPException(status_code=422, detail=e.errores)
+    except idempotencia.ClaveReutilizadaError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@router.get("/ventas/", response_model=List[schemas.Venta])
+async def read_ventas_async(skip: int = 0, limit: int = 100, after: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+    try:
+        ventas = await crud_async.get_ventas_filas(db, skip=skip, limit=limit, after=after)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    respuesta = serializacion.respuesta_lista(schemas.Venta, ventas)
+    _cursor_siguiente(respuesta, ventas, crud.cursor_venta_fila, limit)
+    return respuesta
+
+@router.get("/ventas/{venta_id}", response_model=schemas.Venta)
+async def read_venta_async(venta_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_venta = await crud_async.get_venta(db, venta_id=venta_id, carga="joined")
+    if db_venta is None:
+        raise HTTPException(status_code=404, detail="Venta no encontrada")
+    return db_venta
+
+@router.get("/ventas/cliente/{cliente_id}", response_model=List[schemas.Venta])
+async def read_ventas_cliente_async(cliente_id: int, db: AsyncSession = Depends(get_async_db)):
+    ventas = await crud_async.get_ventas_cliente_filas(db, cliente_id)
+    return serializacion.respuesta_lista(schemas.Venta, ventas)
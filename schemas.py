@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr
 from typing import List, Optional
-from datetime import datetime
+from datetime import date, datetime
 from pydantic import validator
 
 # Cliente Schemas
@@ -15,6 +15,7 @@ class ClienteCreate(ClienteBase):
 
 class Cliente(ClienteBase):
     id: int
+    version: int
     activo: bool
     fecha_creacion: datetime
 
@@ -34,13 +35,64 @@ class ProductoBase(BaseModel):
 class ProductoCreate(ProductoBase):
     pass
 
+class ProductoCarga(ProductoCreate):
+    # Carga masiva: con id de un producto existente se actualiza
+    id: Optional[int] = None
+
 class Producto(ProductoBase):
     id: int
+    version: int
     fecha_creacion: datetime
 
     class Config:
         from_attributes = True
 
+class FiltroProductos(BaseModel):
+    # Filtros de GET /productos/ (parametros de consulta)
+    talla: Optional[str] = None
+    color: Optional[str] = None
+    precio_min: Optional[float] = None
+    precio_max: Optional[float] = None
+    stock_min: Optional[int] = None
+    # Busqueda de texto en nombre y descripcion
+    q: Optional[str] = None
+
+class Disponibilidad(BaseModel):
+    id_producto: int
+    desde: date
+    hasta: date
+    stock: int
+    reservados: int
+    disponibles: int
+
+# Carga masiva
+class ErrorFila(BaseModel):
+    fila: int
+    errores: List[str]
+
+class ResultadoCarga(BaseModel):
+    recibidas: int
+    procesadas: int
+    errores: List[ErrorFila]
+
+# Cambios de estado en bloque (PUT /alquileres/estado y PUT /ventas/estado)
+class CambioEstado(BaseModel):
+    ids: List[int]
+    estado: str
+
+    @validator('ids')
+    def validar_ids(cls, v):
+        if not v:
+            raise ValueError("Indica al menos un pedido")
+        if len(v) > 1000:
+            raise ValueError("Como máximo 1000 pedidos por petición")
+        return v
+
+class ResultadoCambioEstado(BaseModel):
+    actualizados: List[int]
+    sin_cambios: List[int]
+    no_encontrados: List[int]
+
 # DetalleAlquiler Schemas
 class DetalleAlquilerBase(BaseModel):
     id_producto: int
@@ -49,7 +101,15 @@ class DetalleAlquilerBase(BaseModel):
     subtotal: float
 
 class DetalleAlquilerCreate(DetalleAlquilerBase):
-    pass
+    # Los importes los calcula el servidor (ver precios.py); se aceptan y se ignoran
+    precio_unitario: Optional[float] = None
+    subtotal: Optional[float] = None
+
+    @validator('cantidad')
+    def validar_cantidad(cls, v):
+        if v <= 0:
+            raise ValueError("La cantidad debe ser mayor que cero")
+        return v
 
 class DetalleAlquiler(DetalleAlquilerBase):
     id: int
@@ -66,8 +126,15 @@ class AlquilerBase(BaseModel):
     total: float
 
 class AlquilerCreate(AlquilerBase):
+    total: Optional[float] = None
     detalles: List[DetalleAlquilerCreate]
 
+    @validator('fecha_fin')
+    def validar_fechas(cls, v, values):
+        if 'fecha_inicio' in values and v < values['fecha_inicio']:
+            raise ValueError("La fecha de fin no puede ser anterior a la de inicio")
+        return v
+
     @validator('detalles')
     def validar_detalles(cls, v):
         if not v:
@@ -78,6 +145,7 @@ class Alquiler(AlquilerBase):
     id: int
     estado: str
     fecha_creacion: datetime
+    fecha_devolucion: Optional[datetime] = None
     detalles: List[DetalleAlquiler]
 
     class Config:
@@ -91,7 +159,15 @@ class DetalleVentaBase(BaseModel):
     subtotal: float
 
 class DetalleVentaCreate(DetalleVentaBase):
-    pass
+    # Los importes los calcula el servidor (ver precios.py); se aceptan y se ignoran
+    precio_unitario: Optional[float] = None
+    subtotal: Optional[float] = None
+
+    @validator('cantidad')
+    def validar_cantidad(cls, v):
+        if v <= 0:
+            raise ValueError("La cantidad debe ser mayor que cero")
+        return v
 
 class DetalleVenta(DetalleVentaBase):
     id: int
@@ -106,6 +182,7 @@ class VentaBase(BaseModel):
     total: float
 
 class VentaCreate(VentaBase):
+    total: Optional[float] = None
     detalles: List[DetalleVentaCreate]
 
     @validator('detalles')
@@ -119,7 +196,33 @@ class Venta(VentaBase):
     fecha_venta: datetime
     estado: str
     fecha_creacion: datetime
+    fecha_pago: Optional[datetime] = None
     detalles: List[DetalleVenta]
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True
+
+# Reportes
+class IngresoPeriodo(BaseModel):
+    periodo: str
+    tipo: str
+    pedidos: int
+    unidades: int
+    ingresos: float
+
+class ProductoTop(BaseModel):
+    id_producto: int
+    nombre: str
+    talla: str
+    color: str
+    unidades: int
+    ingresos: float
+
+class UtilizacionProducto(BaseModel):
+    id_producto: Optional[int] = None
+    nombre: Optional[str] = None
+    talla: Optional[str] = None
+    color: Optional[str] = None
+    unidades_dia_reservadas: int
+    unidades_dia_disponibles: int
+    utilizacion: float
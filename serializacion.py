@@ -0,0 +1,30 @@
+from fastapi import Response
+from functools import lru_cache
+from pydantic import TypeAdapter
+from typing import List
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Serializacion rapida de listados. Con response_model, FastAPI valida cada
+# objeto ORM con from_attributes y despues hace una segunda pasada con
+# jsonable_encoder y json.dumps. Aqui se parte de diccionarios que ya tienen
+# las columnas y los tipos del esquema (ver crud._filas_con_detalles) y se
+# codifican de una vez: con orjson si esta instalado o, si no, validando y
+# volcando la lista entera con un TypeAdapter de pydantic-core.
+
+@lru_cache(maxsize=None)
+def _adaptador(esquema):
+    return TypeAdapter(List[esquema])
+
+def codificar_lista(esquema, filas) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(filas)
+    adaptador = _adaptador(esquema)
+    return adaptador.dump_json(adaptador.validate_python(filas))
+
+def respuesta_lista(esquema, filas):
+    # Se devuelve la Response directamente, asi FastAPI no vuelve a validar con response_model
+    return Response(content=codificar_lista(esquema, filas), media_type="application/json")
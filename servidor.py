@@ -0,0 +1,94 @@
+"""Arranque de produccion de la API con varios workers.
+
+Lanza N procesos de uvicorn (por defecto uno por nucleo) sobre main:app,
+con uvloop y httptools si estan instalados. Cada worker tiene su propio pool
+de conexiones: con --max-conexiones el total se reparte entre los workers
+(POOL_SIZE y MAX_OVERFLOW de cada uno); sin el, cada worker usa los valores
+de la configuracion y se avisa del total resultante.
+
+Con SIGTERM o Ctrl+C cada worker deja de aceptar conexiones, espera a que
+terminen las peticiones en curso (checkouts incluidos) hasta --timeout-apagado
+y despues vacia la cola de tareas (ver tareas.py).
+
+    python servidor.py --workers 4 --port 8000
+    python servidor.py --max-conexiones 60 --keep-alive 15 --backlog 4096
+"""
+import argparse
+import importlib.util
+import os
+import sys
+
+
+def _disponible(modulo: str):
+    return importlib.util.find_spec(modulo) is not None
+
+def repartir_conexiones(max_conexiones: int, workers: int, pools_por_worker: int = 1):
+    # (pool_size, max_overflow) de cada pool para no pasar de max_conexiones
+    # en total; dos tercios fijas y el resto de overflow. Cada pool necesita
+    # al menos una conexion
+    if max_conexiones < workers * pools_por_worker:
+        raise ValueError(
+            f"{max_conexiones} conexiones no alcanzan para {workers} workers "
+            f"con {pools_por_worker} pool(s) cada uno"
+        )
+    por_pool = max_conexiones // (workers * pools_por_worker)
+    pool_size = max(1, por_pool * 2 // 3)
+    return pool_size, por_pool - pool_size
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor de produccion de la API de Vestibox")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Procesos; por defecto uno por nucleo")
+    parser.add_argument("--keep-alive", type=int, default=5, help="Segundos que se mantiene abierta una conexion inactiva")
+    parser.add_argument("--backlog", type=int, default=2048, help="Conexiones pendientes de aceptar en el socket")
+    parser.add_argument("--max-conexiones", type=int, help="Conexiones a la base de datos entre todos los workers")
+    parser.add_argument("--timeout-apagado", type=int, default=30, help="Segundos de espera a las peticiones en curso al parar")
+    parser.add_argument("--limite-peticiones", type=int, help="Reiniciar cada worker tras este numero de peticiones")
+    parser.add_argument("--log-level", default="info")
+    argumentos = parser.parse_args()
+    if argumentos.workers < 1:
+        parser.error("--workers debe ser al menos 1")
+
+    from config import Settings
+
+    # Los workers heredan el entorno: la configuracion del pool se fija aqui,
+    # antes de lanzarlos, y config.settings la lee en cada uno. En modo
+    # asincrono cada worker tiene dos pools
+    pools = 2 if Settings().db_async else 1
+    if argumentos.max_conexiones:
+        try:
+            pool_size, max_overflow = repartir_conexiones(argumentos.max_conexiones, argumentos.workers, pools)
+        except ValueError as e:
+            parser.error(f"--max-conexiones: {e}; baja --workers o sube el limite")
+        os.environ["POOL_SIZE"] = str(pool_size)
+        os.environ["MAX_OVERFLOW"] = str(max_overflow)
+    settings = Settings()
+
+    print(
+        f"{argumentos.workers} workers; pool por worker {settings.pool_size}+{settings.max_overflow} "
+        f"(hasta {argumentos.workers * pools * (settings.pool_size + settings.max_overflow)} conexiones); "
+        f"bucle {'uvloop' if _disponible('uvloop') else 'asyncio'}, http {'httptools' if _disponible('httptools') else 'h11'}",
+        file=sys.stderr,
+    )
+
+    import uvicorn
+
+    uvicorn.run(
+        "main:app",
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        host=argumentos.host,
+        port=argumentos.port,
+        workers=argumentos.workers,
+        loop="auto",
+        http="auto",
+        backlog=argumentos.backlog,
+        timeout_keep_alive=argumentos.keep_alive,
+        timeout_graceful_shutdown=argumentos.timeout_apagado,
+        limit_max_requests=argumentos.limite_peticiones,
+        log_level=argumentos.log_level,
+        access_log=False,
+    )
+
+if __name__ == "__main__":
+    main()
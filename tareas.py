@@ -0,0 +1,300 @@
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import delete, insert, select, update
+from collections import defaultdict
+from datetime import datetime
+import asyncio
+import json
+import logging
+import threading
+from database import SessionLocal
+from config import settings
+import models
+
+# Cola de tareas en segundo plano para el trabajo que sigue a un cambio
+# (tablas de resumen, devolucion de stock y ocupacion, invalidar la cache,
+# avisos). La peticion responde sin esperar. Un trabajador por proceso agrupa
+# las tareas pendientes en lotes: cada lote se aplica en una sola transaccion
+# (los manejadores reciben todas las tareas de su tipo juntas) y, si falla, se
+# reintenta con espera creciente. Las tareas sin sesion (cache, avisos) se
+# ejecutan despues del commit del lote y no se reintentan.
+#
+# Las tareas con sesion se escriben con guardar() en la tabla
+# tareas_pendientes dentro de la transaccion del cambio que las origina, y se
+# borran en la misma transaccion que las aplica: un cambio confirmado siempre
+# deja su tarea, y una tarea aplicada no se vuelve a aplicar aunque se
+# encole dos veces o la recojan dos procesos. Las que quedan en la tabla
+# (parada brusca, tiempo de parada agotado, reintentos agotados) se vuelven a
+# encolar al arrancar cualquier proceso.
+#
+# Sin la cola arrancada (scripts, consola, tests sin lifespan) las tareas se
+# ejecutan en el acto, en la misma llamada que las encola.
+
+log = logging.getLogger("vestibox.tareas")
+
+_manejadores = {}
+
+def tarea(nombre: str, sesion: bool = True):
+    # Registra el manejador de un tipo de tarea. Con sesion recibe (db, datos)
+    # y se ejecuta dentro de la transaccion del lote; sin ella recibe (datos)
+    # tras el commit. datos es la lista de las tareas de ese tipo del lote.
+    def registrar(funcion):
+        _manejadores[nombre] = (funcion, sesion)
+        return funcion
+    return registrar
+
+def guardar(db, pendientes):
+    # Escribe en la transaccion de db las tareas con sesion de pendientes
+    # [(nombre, datos)] y devuelve todas como (id, nombre, datos) para
+    # ColaTareas.encolar_guardadas tras el commit; las tareas sin sesion
+    # llevan id None. datos debe ser serializable a JSON (fechas en
+    # isoformat, pares en listas)
+    tareas, filas = [], []
+    for nombre, datos in pendientes:
+        if nombre not in _manejadores:
+            raise KeyError(f"Tarea desconocida: {nombre}")
+        datos = datos if datos is not None else {}
+        serializados = None
+        if _manejadores[nombre][1]:
+            serializados = json.dumps(datos)
+            filas.append({"nombre": nombre, "datos": serializados, "intentos": 0, "fecha_creacion": datetime.utcnow()})
+        tareas.append((serializados, nombre, datos))
+    if not filas:
+        return [(None, nombre, datos) for _, nombre, datos in tareas]
+    if db.get_bind().dialect.insert_executemany_returning:
+        # Un INSERT multi-fila para todo el cambio en vez de uno por tarea. El
+        # orden de RETURNING no esta garantizado: los ids se reparten por
+        # (nombre, datos), y dos tareas iguales son intercambiables
+        ids = defaultdict(list)
+        for id_tarea, nombre, serializados in db.execute(
+            insert(models.TareaPendiente).returning(
+                models.TareaPendiente.id, models.TareaPendiente.nombre, models.TareaPendiente.datos
+            ),
+            filas
+        ):
+            ids[nombre, serializados].append(id_tarea)
+        return [
+            (ids[nombre, serializados].pop() if serializados is not None else None, nombre, datos)
+            for serializados, nombre, datos in tareas
+        ]
+    # Sin RETURNING en executemany (MySQL) la sesion inserta fila a fila
+    guardadas = [models.TareaPendiente(**fila) for fila in filas]
+    db.add_all(guardadas)
+    db.flush()
+    ids = iter(fila.id for fila in guardadas)
+    return [(next(ids) if serializados is not None else None, nombre, datos) for serializados, nombre, datos in tareas]
+
+class ColaTareas:
+    def __init__(self, lote: int = 100, reintentos: int = 5, espera: float = 0.5):
+        self.lote = lote
+        self.reintentos = reintentos
+        self.espera = espera
+        self._bucle = None
+        self._cola = None
+        self._trabajador = None
+        self._recuperadas = None
+        self._lock = threading.Lock()
+        self._completadas = 0
+        self._fallidas = 0
+        self._reintentos = 0
+        self._lotes = 0
+
+    def encolar(self, nombre: str, datos=None):
+        # Tarea sin guardar en la base de datos (no sobrevive a una parada)
+        if nombre not in _manejadores:
+            raise KeyError(f"Tarea desconocida: {nombre}")
+        self.encolar_guardadas([(None, nombre, datos if datos is not None else {})])
+
+    def encolar_guardadas(self, tareas):
+        # tareas es lo que devuelve guardar(), ya confirmado
+        bucle = self._bucle
+        if bucle is not None:
+            try:
+                for tarea in tareas:
+                    bucle.call_soon_threadsafe(self._cola.put_nowait, tarea)
+                return
+            except RuntimeError:
+                # El bucle se cerro entre medias; las guardadas siguen en la tabla
+                pass
+        if not tareas:
+            return
+        try:
+            self._ejecutar(tareas)
+        except Exception:
+            log.exception("Tareas %s fallidas", ", ".join(sorted({nombre for _, nombre, _ in tareas})))
+            self._contar(fallidas=len(tareas))
+            self._marcar_fallidas([id_tarea for id_tarea, _, _ in tareas if id_tarea is not None])
+
+    def _contar(self, **incrementos):
+        with self._lock:
+            for campo, incremento in incrementos.items():
+                setattr(self, f"_{campo}", getattr(self, f"_{campo}") + incremento)
+
+    def _ejecutar(self, lote):
+        db = SessionLocal()
+        try:
+            guardadas = [id_tarea for id_tarea, _, _ in lote if id_tarea is not None]
+            if guardadas:
+                # Solo las que siguen en la tabla: las demas ya las aplico este
+                # u otro proceso. FOR UPDATE hace esperar a quien las este
+                # aplicando a la vez (SQLite serializa las escrituras)
+                vigentes = set(db.execute(
+                    select(models.TareaPendiente.id)
+                    .where(models.TareaPendiente.id.in_(guardadas))
+                    .with_for_update()
+                ).scalars())
+                lote = [tarea for tarea in lote if tarea[0] is None or tarea[0] in vigentes]
+            por_tipo = defaultdict(list)
+            for _, nombre, datos in lote:
+                por_tipo[nombre].append(datos)
+            for nombre, datos in por_tipo.items():
+                funcion, sesion = _manejadores[nombre]
+                if sesion:
+                    funcion(db, datos)
+            if guardadas and vigentes:
+                borradas = db.execute(
+                    delete(models.TareaPendiente)
+                    .where(models.TareaPendiente.id.in_(vigentes))
+                    .execution_options(synchronize_session=False)
+                ).rowcount
+                if borradas != len(vigentes):
+                    raise RuntimeError("Tareas aplicadas por otro proceso a la vez; se reintenta el lote")
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        # El lote ya esta confirmado: un fallo aqui no debe repetirlo
+        for nombre, datos in por_tipo.items():
+            funcion, sesion = _manejadores[nombre]
+            if not sesion:
+                try:
+                    funcion(datos)
+                except Exception:
+                    log.exception("Tarea %s fallida tras el commit", nombre)
+        self._contar(completadas=len(lote), lotes=1)
+
+    def _marcar_fallidas(self, ids):
+        # Quedan en la tabla para el siguiente arranque
+        if not ids:
+            return
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(models.TareaPendiente)
+                .where(models.TareaPendiente.id.in_(ids))
+                .values(intentos=models.TareaPendiente.intentos + 1)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            log.warning("No se pudieron marcar %d tareas fallidas", len(ids), exc_info=True)
+        finally:
+            db.close()
+
+    def _leer_guardadas(self):
+        db = SessionLocal()
+        try:
+            filas = db.execute(
+                select(models.TareaPendiente.id, models.TareaPendiente.nombre, models.TareaPendiente.datos)
+                .order_by(models.TareaPendiente.id)
+            ).all()
+        finally:
+            db.close()
+        return [(id_tarea, nombre, json.loads(datos)) for id_tarea, nombre, datos in filas if nombre in _manejadores]
+
+    async def _procesar(self, lote):
+        for intento in range(self.reintentos):
+            try:
+                await run_in_threadpool(self._ejecutar, lote)
+                return
+            except Exception:
+                log.warning("Lote de %d tareas fallido (intento %d)", len(lote), intento + 1, exc_info=True)
+                self._contar(reintentos=1)
+                await asyncio.sleep(self.espera * 2 ** intento)
+        if len(lote) > 1:
+            # Separar las tareas para que una que falla siempre no arrastre al resto
+            for tarea in lote:
+                await self._procesar([tarea])
+            return
+        id_tarea, nombre, datos = lote[0]
+        self._contar(fallidas=1)
+        if id_tarea is None:
+            log.error("Tarea %s descartada tras %d intentos: %s", nombre, self.reintentos, datos)
+        else:
+            log.error("Tarea %s %d fallida tras %d intentos; se reintentara al arrancar", nombre, id_tarea, self.reintentos)
+            await run_in_threadpool(self._marcar_fallidas, [id_tarea])
+
+    async def _recuperar(self):
+        # Tareas guardadas que quedaron sin aplicar; si la base de datos no
+        # responde al arrancar se reintenta con espera creciente
+        espera = self.espera
+        while True:
+            try:
+                guardadas = await run_in_threadpool(self._leer_guardadas)
+                break
+            except Exception:
+                log.warning("No se pudieron leer las tareas pendientes; reintento en %.1f s", espera, exc_info=True)
+                await asyncio.sleep(espera)
+                espera = min(espera * 2, 30)
+        if guardadas:
+            log.info("%d tareas pendientes recuperadas", len(guardadas))
+        for tarea in guardadas:
+            self._cola.put_nowait(tarea)
+        self._recuperadas.set()
+
+    async def _trabajar(self):
+        await self._recuperar()
+        while True:
+            lote = [await self._cola.get()]
+            while len(lote) < self.lote and not self._cola.empty():
+                lote.append(self._cola.get_nowait())
+            try:
+                await self._procesar(lote)
+            finally:
+                for _ in lote:
+                    self._cola.task_done()
+
+    async def iniciar(self):
+        self._cola = asyncio.Queue()
+        self._recuperadas = asyncio.Event()
+        self._trabajador = asyncio.create_task(self._trabajar())
+        self._bucle = asyncio.get_running_loop()
+
+    async def detener(self, timeout: float = None):
+        # Deja de aceptar tareas en segundo plano y espera a que se vacie la
+        # cola. Si se agota el tiempo, las tareas guardadas siguen en la tabla
+        # y se aplican al arrancar; solo se pierden las de cache y avisos
+        if self._bucle is None:
+            return
+        self._bucle = None
+
+        async def vaciar():
+            await self._recuperadas.wait()
+            await self._cola.join()
+
+        try:
+            await asyncio.wait_for(vaciar(), timeout)
+        except asyncio.TimeoutError:
+            log.warning("Parada con %d tareas sin ejecutar; las guardadas se aplicaran al arrancar", self._cola.qsize())
+        self._trabajador.cancel()
+        try:
+            await self._trabajador
+        except asyncio.CancelledError:
+            pass
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "pendientes": self._cola.qsize() if self._cola is not None and self._bucle is not None else 0,
+                "completadas": self._completadas,
+                "fallidas": self._fallidas,
+                "reintentos": self._reintentos,
+                "lotes": self._lotes,
+            }
+
+cola = ColaTareas(
+    lote=settings.tareas_lote,
+    reintentos=settings.tareas_reintentos,
+)
@@ -0,0 +1,79 @@
+import os
+import sys
+import tempfile
+
+# La aplicacion lee la configuracion al importarse: base de datos SQLite en
+# fichero propia de la sesion de tests y tablas creadas con create_all
+_directorio = tempfile.mkdtemp(prefix="vestibox-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_directorio}/tests.db"
+os.environ["CREAR_TABLAS"] = "1"
+os.environ["CACHE_BACKEND"] = "memoria"
+os.environ.pop("DB_ASYNC", None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from contextlib import contextmanager
+from datetime import datetime
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+import pytest
+
+import busqueda, cache, database, main, models
+
+
+@pytest.fixture(autouse=True)
+def base_de_datos_vacia():
+    # Cada test empieza con las tablas y las caches vacias
+    with database.get_engine().begin() as conexion:
+        for tabla in reversed(models.Base.metadata.sorted_tables):
+            conexion.execute(tabla.delete())
+    cache.catalogo.invalidar()
+    cache.clientes.invalidar()
+    busqueda.productos.invalidar()
+    yield
+
+
+@pytest.fixture
+def db():
+    sesion = database.SessionLocal()
+    try:
+        yield sesion
+    finally:
+        sesion.close()
+
+
+@pytest.fixture
+def api():
+    # Sin lifespan: las tareas posteriores al commit se ejecutan en el acto
+    return TestClient(main.app)
+
+
+@contextmanager
+def contar_sentencias():
+    # Sentencias SQL enviadas al driver dentro del bloque
+    sentencias = []
+
+    def registrar(conexion, cursor, sql, parametros, contexto, varias):
+        sentencias.append(sql)
+
+    engine = database.get_engine()
+    event.listen(engine, "before_cursor_execute", registrar)
+    try:
+        yield sentencias
+    finally:
+        event.remove(engine, "before_cursor_execute", registrar)
+
+
+def sembrar(db, clientes=1, productos=1, stock=100, precio=10.0):
+    # Clientes y productos con ids 1..n
+    db.add_all([
+        models.Cliente(id=i, nombre=f"Cliente {i}", email=f"cliente{i}@vestibox.es")
+        for i in range(1, clientes + 1)
+    ])
+    db.add_all([
+        models.Producto(
+            id=i, nombre=f"vestido {i}", precio_venta=precio, precio_alquiler=precio / 10,
+            stock=stock, talla="M", color="negro", fecha_creacion=datetime(2026, 1, 1)
+        )
+        for i in range(1, productos + 1)
+    ])
+    db.commit()
@@ -0,0 +1,29 @@
+import time
+
+import cache
+import crud
+import models
+from config import settings
+from conftest import sembrar
+
+
+def test_email_sin_cliente_caduca_antes(db, monkeypatch):
+    # Un alta hecha en otro worker no descarta la entrada negativa de este;
+    # debe caducar con cache_ttl_negativo y no con cache_ttl
+    monkeypatch.setattr(settings, "cache_ttl_negativo", 0.05)
+    sembrar(db, clientes=1)
+    assert crud.get_cliente_by_email(db, "nuevo@example.com") is None
+    db.add(models.Cliente(nombre="Nuevo", email="nuevo@example.com"))
+    db.commit()
+    assert crud.get_cliente_by_email(db, "nuevo@example.com") is None
+    time.sleep(0.1)
+    assert crud.get_cliente_by_email(db, "nuevo@example.com") is not None
+
+
+def test_cache_lru_ttl_por_entrada():
+    lru = cache.CacheLRU(10, ttl=60)
+    lru.set("corta", 1, lru.generacion(), ttl=0.05)
+    lru.set("larga", 2, lru.generacion())
+    time.sleep(0.1)
+    assert lru.get("corta") == (False, None)
+    assert lru.get("larga") == (True, 2)
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import func, select
+
+import crud, models
+from conftest import contar_sentencias, sembrar
+
+LINEAS = 3
+
+
+def _pedidos(db, n):
+    # n ventas pendientes y n alquileres pendientes con sus unidades reservadas;
+    # los alquileres usan dos rangos de fechas distintos
+    sembrar(db, clientes=5, productos=LINEAS)
+    inicio = datetime(2026, 11, 2, 10)
+    for i in range(n):
+        fecha_inicio = inicio + timedelta(days=7 * (i % 2))
+        venta = models.Venta(id_cliente=i % 5 + 1, fecha_venta=inicio, total=30, estado="pendiente")
+        venta.detalles = [
+            models.DetalleVenta(id_producto=j + 1, cantidad=1, precio_unitario=10, subtotal=10) for j in range(LINEAS)
+        ]
+        alquiler = models.Alquiler(
+            id_cliente=i % 5 + 1, fecha_inicio=fecha_inicio, fecha_fin=fecha_inicio + timedelta(days=2),
+            total=3, estado="pendiente", fecha_creacion=inicio
+        )
+        alquiler.detalles = [
+            models.DetalleAlquiler(id_producto=j + 1, cantidad=1, precio_unitario=1, subtotal=1) for j in range(LINEAS)
+        ]
+        db.add_all([venta, alquiler])
+        db.flush()
+        crud._reservar_ocupacion(db, {j + 1: 1 for j in range(LINEAS)}, alquiler.fecha_inicio, alquiler.fecha_fin)
+    db.commit()
+    db.expunge_all()
+
+
+@pytest.mark.parametrize("ruta, estado", [("/ventas/estado", "pagado"), ("/alquileres/estado", "cancelado")])
+def test_cambio_en_bloque_con_sentencias_fijas(db, api, ruta, estado):
+    # Las sentencias no dependen del numero de pedidos del lote
+    _pedidos(db, 50)
+    ids = list(range(1, 21))
+    with contar_sentencias() as pocos:
+        respuesta = api.put(ruta, json={"ids": ids, "estado": estado})
+    assert respuesta.status_code == 200
+    assert respuesta.json() == {"actualizados": ids, "sin_cambios": [], "no_encontrados": []}
+
+    ids = list(range(21, 51)) + [1, 999]
+    with contar_sentencias() as muchos:
+        respuesta = api.put(ruta, json={"ids": ids, "estado": estado})
+    assert respuesta.json() == {"actualizados": list(range(21, 51)), "sin_cambios": [1], "no_encontrados": [999]}
+    assert len(muchos) == len(pocos)
+
+
+def test_cancelar_alquileres_libera_la_ocupacion(db, api):
+    _pedidos(db, 10)
+    assert api.put("/alquileres/estado", json={"ids": list(range(1, 11)), "estado": "cancelado"}).status_code == 200
+    assert db.scalar(select(func.max(models.OcupacionProducto.cantidad))) == 0
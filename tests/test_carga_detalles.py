@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+import pytest
+
+import crud, models
+from conftest import contar_sentencias, sembrar
+
+PEDIDOS = 60
+LINEAS = 3
+
+
+@pytest.fixture
+def pedidos(db):
+    sembrar(db, clientes=10, productos=5)
+    inicio = datetime(2026, 3, 1, 10)
+    for i in range(1, PEDIDOS + 1):
+        venta = models.Venta(id_cliente=i % 10 + 1, fecha_venta=inicio + timedelta(hours=i), total=30, estado="pagado")
+        alquiler = models.Alquiler(
+            id_cliente=i % 10 + 1, fecha_inicio=inicio, fecha_fin=inicio + timedelta(days=2),
+            total=3, estado="devuelto", fecha_creacion=inicio + timedelta(hours=i)
+        )
+        venta.detalles = [
+            models.DetalleVenta(id_producto=j + 1, cantidad=1, precio_unitario=10, subtotal=10) for j in range(LINEAS)
+        ]
+        alquiler.detalles = [
+            models.DetalleAlquiler(id_producto=j + 1, cantidad=1, precio_unitario=1, subtotal=1) for j in range(LINEAS)
+        ]
+        db.add_all([venta, alquiler])
+    db.commit()
+    db.expunge_all()
+
+
+def _sentencias(db, funcion, **opciones):
+    with contar_sentencias() as sentencias:
+        pedidos = funcion(db, **opciones)
+        # Recorrer los detalles no debe lanzar ninguna consulta mas
+        lineas = sum(len(pedido["detalles"] if isinstance(pedido, dict) else pedido.detalles) for pedido in pedidos)
+    db.expunge_all()
+    assert lineas == len(pedidos) * LINEAS
+    return len(sentencias)
+
+
+@pytest.mark.parametrize("funcion", [crud.get_ventas, crud.get_alquileres])
+@pytest.mark.parametrize("carga, esperadas", [("selectin", 2), ("joined", 1)])
+def test_paginas_orm_con_consultas_fijas(db, pedidos, funcion, carga, esperadas):
+    assert _sentencias(db, funcion, limit=5, carga=carga) == esperadas
+    assert _sentencias(db, funcion, limit=50, carga=carga) == esperadas
+
+
+@pytest.mark.parametrize("funcion", [crud.get_ventas_filas, crud.get_alquileres_filas])
+def test_paginas_de_filas_con_consultas_fijas(db, pedidos, funcion):
+    assert _sentencias(db, funcion, limit=5) == 2
+    assert _sentencias(db, funcion, limit=50) == 2
+
+
+@pytest.mark.parametrize("funcion", [crud.get_ventas_cliente, crud.get_alquileres_cliente])
+def test_historial_de_cliente_sin_consulta_por_pedido(db, pedidos, funcion):
+    with contar_sentencias() as sentencias:
+        historial = funcion(db, 1)
+        assert sum(len(pedido.detalles) for pedido in historial) == len(historial) * LINEAS
+    assert len(historial) == PEDIDOS // 10
+    assert len(sentencias) == 2
@@ -0,0 +1,57 @@
+from datetime import date, datetime, time, timedelta
+
+import models
+from conftest import sembrar
+
+
+def _alquiler(api, id_cliente, cantidad, dias=(7, 9)):
+    inicio = datetime.combine(date.today() + timedelta(days=dias[0]), time(10))
+    fin = datetime.combine(date.today() + timedelta(days=dias[1]), time(10))
+    return api.post("/alquileres/", json={
+        "id_cliente": id_cliente, "fecha_inicio": inicio.isoformat(), "fecha_fin": fin.isoformat(),
+        "detalles": [{"id_producto": 1, "cantidad": cantidad}],
+    })
+
+
+def _venta(api, id_cliente, cantidad):
+    return api.post("/ventas/", json={"id_cliente": id_cliente, "detalles": [{"id_producto": 1, "cantidad": cantidad}]})
+
+
+def _stock(db):
+    db.expire_all()
+    return db.query(models.Producto.stock).filter(models.Producto.id == 1).scalar()
+
+
+def test_alquiler_sin_unidades_libres(api, db):
+    sembrar(db, clientes=3, stock=5)
+    assert _alquiler(api, 1, 3).status_code == 200
+    assert _alquiler(api, 2, 3).status_code == 409
+    # Otras fechas no se solapan
+    assert _alquiler(api, 2, 3, dias=(20, 22)).status_code == 200
+    desde = date.today() + timedelta(days=8)
+    disponibilidad = api.get("/productos/1/disponibilidad", params={"desde": desde, "hasta": desde}).json()
+    assert (disponibilidad["reservados"], disponibilidad["disponibles"]) == (3, 2)
+
+
+def test_venta_respeta_las_unidades_reservadas(api, db):
+    # 5 unidades y 3 reservadas la semana que viene: solo se pueden vender 2
+    sembrar(db, clientes=3, stock=5)
+    assert _alquiler(api, 1, 3).status_code == 200
+    assert _venta(api, 2, 3).status_code == 409
+    assert _stock(db) == 5
+    assert _venta(api, 2, 2).status_code == 200
+    assert _stock(db) == 3
+    assert _venta(api, 3, 1).status_code == 409
+    assert _stock(db) == 3
+    # Al devolver el alquiler las unidades vuelven a poder venderse
+    assert api.put("/alquileres/1/estado", params={"estado": "devuelto"}).status_code == 200
+    assert _venta(api, 3, 3).status_code == 200
+    assert _stock(db) == 0
+
+
+def test_reservas_pasadas_no_bloquean_ventas(api, db):
+    sembrar(db, clientes=2, stock=4)
+    db.add(models.OcupacionProducto(id_producto=1, fecha=date.today() - timedelta(days=3), cantidad=4))
+    db.commit()
+    assert _venta(api, 1, 4).status_code == 200
+    assert _stock(db) == 0
@@ -0,0 +1,33 @@
+import pytest
+
+import models
+from conftest import sembrar
+
+
+@pytest.mark.parametrize("ruta", ["/productos/1", "/productos/?limit=5"])
+def test_cambio_en_otro_worker_renueva_el_etag(db, api, ruta):
+    sembrar(db, productos=3)
+    primera = api.get(ruta)
+    assert primera.status_code == 200
+    etag = primera.headers["ETag"]
+    assert api.get(ruta, headers={"If-None-Match": etag}).status_code == 304
+
+    # Cambio hecho por otro worker: la cache de este proceso no se entera
+    producto = db.get(models.Producto, 1)
+    producto.nombre = "vestido 1 rebajado"
+    db.commit()
+
+    tercera = api.get(ruta, headers={"If-None-Match": etag})
+    assert tercera.status_code == 200
+    assert tercera.headers["ETag"] != etag
+    cuerpo = tercera.json()
+    assert (cuerpo if isinstance(cuerpo, dict) else cuerpo[0])["nombre"] == "vestido 1 rebajado"
+    assert api.get(ruta, headers={"If-None-Match": tercera.headers["ETag"]}).status_code == 304
+
+
+def test_etag_de_producto_borrado(db, api):
+    sembrar(db, productos=1)
+    etag = api.get("/productos/1").headers["ETag"]
+    db.delete(db.get(models.Producto, 1))
+    db.commit()
+    assert api.get("/productos/1", headers={"If-None-Match": etag}).status_code == 404
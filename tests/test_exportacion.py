@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+import json
+import tracemalloc
+
+import crud, models
+from conftest import contar_sentencias, sembrar
+
+
+def _ventas(db, numero, desde=1):
+    # Ventas con tres lineas, salvo una de cada diez que no tiene detalles
+    inicio = datetime(2026, 1, 1)
+    db.execute(insert(models.Venta), [
+        {"id": i, "id_cliente": 1, "fecha_venta": inicio + timedelta(minutes=i), "total": 30.0,
+         "estado": "pagado" if i % 4 else "pendiente"}
+        for i in range(desde, desde + numero)
+    ])
+    db.execute(insert(models.DetalleVenta), [
+        {"id_venta": i, "id_producto": 1, "cantidad": linea, "precio_unitario": 10.0, "subtotal": 10.0 * linea}
+        for i in range(desde, desde + numero) if i % 10
+        for linea in (1, 2, 3)
+    ])
+    db.commit()
+
+
+def test_exportacion_por_lotes_completa(api, db):
+    sembrar(db)
+    _ventas(db, 25)
+    with contar_sentencias() as sentencias:
+        exportadas = list(crud.exportar_ventas(db, estado="pagado", lote=4))
+    esperadas = [i for i in range(1, 26) if i % 4]
+    assert [venta["id"] for venta in exportadas] == esperadas
+    assert all(len(venta["detalles"]) == (3 if venta["id"] % 10 else 0) for venta in exportadas)
+    assert [linea["cantidad"] for linea in exportadas[0]["detalles"]] == [1, 2, 3]
+    # Dos consultas por lote de cuatro cabeceras
+    assert len(sentencias) == 2 * -(-len(esperadas) // 4)
+
+    respuesta = api.get("/ventas/export", params={"estado": "pagado"})
+    assert [json.loads(linea)["id"] for linea in respuesta.text.splitlines()] == esperadas
+
+
+def test_exportacion_con_memoria_constante(db):
+    # El pico de memoria de recorrer la exportacion no crece con la tabla
+    sembrar(db)
+
+    def pico():
+        tracemalloc.start()
+        try:
+            for _ in crud.exportar_ventas(db, lote=200):
+                pass
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    _ventas(db, 1000)
+    pequena = pico()
+    _ventas(db, 9000, desde=1001)
+    grande = pico()
+    assert grande < pequena * 1.5, (pequena, grande)
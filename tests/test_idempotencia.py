@@ -0,0 +1,59 @@
+import pytest
+
+import idempotencia, models
+from conftest import sembrar
+
+VENTA = {"id_cliente": 1, "detalles": [{"id_producto": 1, "cantidad": 2}, {"id_producto": 2, "cantidad": 1}]}
+
+
+@pytest.fixture
+def catalogo(db):
+    sembrar(db, clientes=1, productos=2, stock=10)
+
+
+def _estado(db):
+    # Stock por producto y lineas de venta guardadas
+    db.expire_all()
+    stock = {producto.id: producto.stock for producto in db.query(models.Producto)}
+    return stock, db.query(models.DetalleVenta).count()
+
+
+def test_reintento_devuelve_la_misma_respuesta(db, api, catalogo):
+    primera = api.post("/ventas/", json=VENTA, headers={"Idempotency-Key": "venta-1"})
+    assert primera.status_code == 200
+    assert _estado(db) == ({1: 8, 2: 9}, 2)
+
+    segunda = api.post("/ventas/", json=VENTA, headers={"Idempotency-Key": "venta-1"})
+    assert segunda.status_code == 200
+    assert segunda.json() == primera.json()
+    # El stock se desconto una sola vez
+    assert _estado(db) == ({1: 8, 2: 9}, 2)
+
+
+def test_misma_clave_con_otro_cuerpo(db, api, catalogo):
+    assert api.post("/ventas/", json=VENTA, headers={"Idempotency-Key": "venta-1"}).status_code == 200
+    otra = {**VENTA, "detalles": [{"id_producto": 1, "cantidad": 1}]}
+    respuesta = api.post("/ventas/", json=otra, headers={"Idempotency-Key": "venta-1"})
+    assert respuesta.status_code == 422
+    assert _estado(db) == ({1: 8, 2: 9}, 2)
+
+
+def test_clave_reclamada_por_una_peticion_en_curso(db, api, catalogo, monkeypatch):
+    # El reintento consulta la clave antes de que la peticion original se
+    # confirme (no la ve) y la reclama despues: el INSERT choca con la clave
+    # primaria y devuelve la respuesta guardada sin aplicar el pedido otra vez
+    primera = api.post("/ventas/", json=VENTA, headers={"Idempotency-Key": "venta-1"})
+    buscar = idempotencia.buscar
+    consultas = []
+
+    def buscar_antes_del_commit(db, clave, huella_peticion):
+        consultas.append(clave)
+        return None if len(consultas) == 1 else buscar(db, clave, huella_peticion)
+
+    monkeypatch.setattr(idempotencia, "buscar", buscar_antes_del_commit)
+    segunda = api.post("/ventas/", json=VENTA, headers={"Idempotency-Key": "venta-1"})
+    assert len(consultas) == 2
+    assert segunda.status_code == 200
+    assert segunda.json() == primera.json()
+    assert _estado(db) == ({1: 8, 2: 9}, 2)
+    assert db.query(models.Venta).count() == 1
@@ -0,0 +1,71 @@
+import asyncio
+import json
+import pytest
+
+import crud, importacion, models, schemas
+from conftest import sembrar
+
+
+def _trozos(texto: str, tamano: int = 1):
+    # Cuerpo en streaming en trozos de pocos bytes: los caracteres de varios
+    # bytes quedan partidos entre trozos
+    datos = texto.encode("utf-8")
+    for inicio in range(0, len(datos), tamano):
+        yield datos[inicio:inicio + tamano]
+
+
+class _Peticion:
+    # Lo que usa importacion de Request: cabeceras y stream() en trozos. El
+    # TestClient entrega el cuerpo de una vez y no parte los caracteres
+    def __init__(self, tipo, trozos):
+        self.headers = {"content-type": tipo}
+        self._trozos = trozos
+
+    async def stream(self):
+        for trozo in self._trozos:
+            yield trozo
+
+
+@pytest.mark.parametrize("tipo, cuerpo", [
+    ("application/x-ndjson", "\n".join(json.dumps({
+        "nombre": f"Señora Núñez {i}", "email": f"nunez{i}@vestibox.es", "direccion": "Calle Año 5, 2º €"
+    }, ensure_ascii=False) for i in range(3))),
+    ("text/csv", "nombre,email,direccion\n" + "\n".join(
+        f'Señora Núñez {i},nunez{i}@vestibox.es,"Calle Año 5, 2º €"' for i in range(3)
+    )),
+])
+@pytest.mark.parametrize("tamano", [1, 3])
+def test_carga_con_caracteres_partidos(db, tipo, cuerpo, tamano):
+    peticion = _Peticion(tipo, _trozos(cuerpo, tamano))
+    resultado = asyncio.run(importacion.importar(peticion, schemas.ClienteCreate, crud.cargar_clientes, db))
+    assert resultado.model_dump() == {"recibidas": 3, "procesadas": 3, "errores": []}
+    clientes = db.query(models.Cliente).order_by(models.Cliente.email).all()
+    assert [cliente.nombre for cliente in clientes] == [f"Señora Núñez {i}" for i in range(3)]
+    assert {cliente.direccion for cliente in clientes} == {"Calle Año 5, 2º €"}
+
+
+def test_recarga_sin_stock_conserva_el_stock(db, api):
+    sembrar(db, productos=2, stock=7)
+    filas = [
+        {"id": 1, "nombre": "vestido 1 nuevo", "precio_venta": 12, "precio_alquiler": 2, "talla": "L", "color": "rojo"},
+        {"id": 2, "nombre": "vestido 2", "precio_venta": 10, "precio_alquiler": 1, "stock": 3, "talla": "M", "color": "negro"},
+        {"nombre": "vestido 3", "precio_venta": 10, "precio_alquiler": 1, "talla": "S", "color": "azul"},
+    ]
+    respuesta = api.post("/productos/bulk", json=filas)
+    assert respuesta.json() == {"recibidas": 3, "procesadas": 3, "errores": []}
+    productos = {producto.nombre: producto for producto in db.query(models.Producto)}
+    assert productos["vestido 1 nuevo"].stock == 7
+    assert productos["vestido 1 nuevo"].talla == "L"
+    assert productos["vestido 2"].stock == 3
+    assert productos["vestido 3"].stock == 0
+
+
+def test_emails_repetidos_cuentan_una_vez(db, api):
+    filas = [
+        {"nombre": "Ana", "email": "ana@vestibox.es"},
+        {"nombre": "Ana María", "email": "ana@vestibox.es"},
+        {"nombre": "Luis", "email": "luis@vestibox.es"},
+    ]
+    respuesta = api.post("/clientes/bulk", json=filas)
+    assert respuesta.json() == {"recibidas": 3, "procesadas": 2, "errores": []}
+    assert db.query(models.Cliente).count() == 2
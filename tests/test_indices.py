@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, text
+import os
+import pytest
+
+import crud, models
+from conftest import sembrar
+
+# Los planes de las consultas por cliente deben usar los indices compuestos
+# (ver migracion 0002). MYSQL_TEST_URL (una base de datos vacia de pruebas)
+# repite las comprobaciones con EXPLAIN de MySQL
+
+def _pendiente(db, modelo):
+    return db.query(modelo).filter(modelo.id_cliente == 7, modelo.estado == "pendiente")
+
+CONSULTAS = [
+    ("ix_alquileres_cliente_estado", lambda db: _pendiente(db, models.Alquiler)),
+    ("ix_ventas_cliente_estado", lambda db: _pendiente(db, models.Venta)),
+    ("ix_alquileres_cliente_fecha", lambda db: crud._alquileres_cliente(db.query(models.Alquiler), 7)),
+    ("ix_ventas_cliente_fecha", lambda db: crud._ventas_cliente(db.query(models.Venta), 7)),
+    ("ix_alquileres_cliente_fecha", lambda db: crud._pagina_alquileres(
+        db.query(models.Alquiler), after=crud.codificar_cursor(7, datetime(2026, 3, 1), 100)
+    )),
+    ("ix_ventas_cliente_fecha", lambda db: crud._pagina_ventas(
+        db.query(models.Venta), after=crud.codificar_cursor(7, datetime(2026, 3, 1), 100)
+    )),
+]
+
+
+def _sql(query, dialecto):
+    return str(query.statement.compile(dialect=dialecto, compile_kwargs={"literal_binds": True}))
+
+
+def _pedidos(db, clientes=50, por_cliente=20):
+    inicio = datetime(2026, 1, 1)
+    for i in range(clientes * por_cliente):
+        fecha = inicio + timedelta(hours=i)
+        estado = "pendiente" if i % por_cliente == 0 else "pagado"
+        db.add(models.Venta(id_cliente=i % clientes + 1, fecha_venta=fecha, total=10, estado=estado))
+        db.add(models.Alquiler(
+            id_cliente=i % clientes + 1, fecha_inicio=fecha, fecha_fin=fecha + timedelta(days=1),
+            total=1, estado=estado, fecha_creacion=fecha
+        ))
+    db.commit()
+
+
+@pytest.mark.parametrize("indice, consulta", CONSULTAS)
+def test_plan_sqlite(db, indice, consulta):
+    sembrar(db, clientes=50)
+    _pedidos(db)
+    db.execute(text("ANALYZE"))
+    plan = " ".join(fila[-1] for fila in db.execute(text("EXPLAIN QUERY PLAN " + _sql(consulta(db), db.get_bind().dialect))))
+    assert f"USING INDEX {indice}" in plan or f"USING COVERING INDEX {indice}" in plan, plan
+    # El orden del historial sale del indice, sin ordenar en memoria
+    assert "TEMP B-TREE" not in plan, plan
+
+
+@pytest.fixture(scope="module")
+def mysql():
+    url = os.environ.get("MYSQL_TEST_URL")
+    if not url:
+        pytest.skip("MYSQL_TEST_URL no definida")
+    engine = create_engine(url)
+    models.Base.metadata.create_all(bind=engine)
+    yield engine
+    models.Base.metadata.drop_all(bind=engine)
+    engine.dispose()
+
+
+@pytest.mark.parametrize("indice, consulta", CONSULTAS)
+def test_plan_mysql(db, mysql, indice, consulta):
+    with mysql.connect() as conexion:
+        filas = conexion.execute(text("EXPLAIN " + _sql(consulta(db), mysql.dialect))).mappings().all()
+    assert any(fila["key"] == indice for fila in filas), filas
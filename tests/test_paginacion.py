@@ -0,0 +1,56 @@
+import pytest
+
+import crud, models
+from conftest import sembrar
+
+
+def test_cursor_recorre_todas_las_paginas(api, db):
+    sembrar(db, clientes=7)
+    vistos, cursor = [], None
+    while True:
+        respuesta = api.get("/clientes/", params={"limit": 3, **({"after": cursor} if cursor else {})})
+        assert respuesta.status_code == 200
+        vistos += [cliente["id"] for cliente in respuesta.json()]
+        cursor = respuesta.headers.get(crud.CABECERA_CURSOR)
+        if cursor is None:
+            break
+    assert vistos == list(range(1, 8))
+
+
+def test_cursor_invalido(api):
+    assert api.get("/clientes/", params={"after": "no-es-un-cursor"}).status_code == 400
+
+
+def test_cabeceras_expuestas_a_navegadores(api, db):
+    sembrar(db, clientes=3)
+    respuesta = api.get("/clientes/", params={"limit": 2}, headers={"Origin": "https://tienda.vestibox.es"})
+    expuestas = {cabecera.strip().lower() for cabecera in respuesta.headers["access-control-expose-headers"].split(",")}
+    assert {crud.CABECERA_CURSOR.lower(), "etag"} <= expuestas
+
+
+@pytest.mark.parametrize("max_ids", [0, 1000])
+def test_paginas_de_busqueda(api, db, monkeypatch, max_ids):
+    # Con 0 la pagina se busca recorriendo los ids en orden; con 1000, con un IN
+    monkeypatch.setattr(crud, "MAX_IDS_BUSQUEDA", max_ids)
+    db.add_all([
+        models.Producto(
+            id=i, nombre="vestido seda" if i % 3 else "traje lino", precio_venta=10.0,
+            precio_alquiler=1.0, stock=5, talla="M" if i % 2 else "L", color="negro",
+        )
+        for i in range(1, 41)
+    ])
+    db.commit()
+    esperados = [i for i in range(1, 41) if i % 3 and i % 2]
+    parametros = {"q": "vest", "talla": "M", "limit": 4}
+
+    vistos, cursor = [], None
+    while True:
+        respuesta = api.get("/productos/", params={**parametros, **({"after": cursor} if cursor else {})})
+        vistos += [producto["id"] for producto in respuesta.json()]
+        cursor = respuesta.headers.get(crud.CABECERA_CURSOR)
+        if cursor is None:
+            break
+    assert vistos == esperados
+
+    respuesta = api.get("/productos/", params={**parametros, "skip": 5})
+    assert [producto["id"] for producto in respuesta.json()] == esperados[5:9]
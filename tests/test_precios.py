@@ -0,0 +1,53 @@
+from datetime import datetime
+import pytest
+
+import models, precios
+from conftest import sembrar
+
+
+@pytest.fixture
+def catalogo(db):
+    # precio_venta 20 y precio_alquiler 2 por dia
+    sembrar(db, clientes=1, productos=2, precio=20.0)
+
+
+def test_venta_ignora_los_importes_del_cliente(db, api, catalogo):
+    venta = {
+        "id_cliente": 1, "total": 0.01,
+        "detalles": [
+            {"id_producto": 1, "cantidad": 2, "precio_unitario": 0.01, "subtotal": 0.02},
+            {"id_producto": 2, "cantidad": 1, "precio_unitario": 999, "subtotal": 999},
+        ],
+    }
+    respuesta = api.post("/ventas/", json=venta)
+    assert respuesta.status_code == 200
+    cuerpo = respuesta.json()
+    assert cuerpo["total"] == 60
+    assert sorted((d["id_producto"], d["precio_unitario"], d["subtotal"]) for d in cuerpo["detalles"]) == [
+        (1, 20, 40), (2, 20, 20)
+    ]
+    assert db.query(models.Venta.total).scalar() == 60
+
+
+def test_alquiler_factura_los_dias_empezados(db, api, catalogo):
+    # 2 dias y 1 hora se facturan como 3 dias
+    alquiler = {
+        "id_cliente": 1, "fecha_inicio": "2026-11-10T10:00:00", "fecha_fin": "2026-11-12T11:00:00", "total": 1,
+        "detalles": [{"id_producto": 1, "cantidad": 2, "precio_unitario": 0.5, "subtotal": 1}],
+    }
+    respuesta = api.post("/alquileres/", json=alquiler)
+    assert respuesta.status_code == 200
+    cuerpo = respuesta.json()
+    assert [(d["precio_unitario"], d["subtotal"]) for d in cuerpo["detalles"]] == [(6, 12)]
+    assert cuerpo["total"] == 12
+
+
+@pytest.mark.parametrize("fin, dias", [
+    (datetime(2026, 11, 10, 10), 1),
+    (datetime(2026, 11, 10, 11), 1),
+    (datetime(2026, 11, 11, 10), 1),
+    (datetime(2026, 11, 11, 10, 1), 2),
+    (datetime(2026, 11, 12, 11), 3),
+])
+def test_dias_alquiler(fin, dias):
+    assert precios.dias_alquiler(datetime(2026, 11, 10, 10), fin) == dias
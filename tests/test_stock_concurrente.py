@@ -0,0 +1,42 @@
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func
+
+import models
+from conftest import sembrar
+
+PETICIONES = 300
+HILOS = 32
+STOCK = 120
+
+
+def test_ventas_concurrentes_no_sobrevenden(api, db):
+    # Cientos de POST /ventas/ en paralelo sobre un mismo producto: se venden
+    # exactamente las unidades que habia y el resto se rechaza con 409
+    sembrar(db, clientes=PETICIONES, productos=1, stock=STOCK)
+
+    def comprar(id_cliente):
+        return api.post("/ventas/", json={"id_cliente": id_cliente, "detalles": [{"id_producto": 1, "cantidad": 1}]})
+
+    with ThreadPoolExecutor(HILOS) as hilos:
+        estados = [respuesta.status_code for respuesta in hilos.map(comprar, range(1, PETICIONES + 1))]
+
+    assert set(estados) <= {200, 409}
+    assert estados.count(200) == STOCK
+    db.expire_all()
+    assert db.query(models.Producto.stock).filter(models.Producto.id == 1).scalar() == 0
+    assert db.query(func.sum(models.DetalleVenta.cantidad)).scalar() == STOCK
+
+
+def test_ventas_concurrentes_con_stock_suficiente(api, db):
+    # Sin agotar el stock, ningun descuento se pierde
+    sembrar(db, clientes=PETICIONES, productos=1, stock=10 * PETICIONES)
+
+    def comprar(id_cliente):
+        return api.post("/ventas/", json={"id_cliente": id_cliente, "detalles": [{"id_producto": 1, "cantidad": 3}]})
+
+    with ThreadPoolExecutor(HILOS) as hilos:
+        estados = [respuesta.status_code for respuesta in hilos.map(comprar, range(1, PETICIONES + 1))]
+
+    assert estados == [200] * PETICIONES
+    db.expire_all()
+    assert db.query(models.Producto.stock).filter(models.Producto.id == 1).scalar() == 7 * PETICIONES
@@ -0,0 +1,71 @@
+import asyncio
+
+import models, tareas
+from conftest import sembrar
+
+
+def _stock(db, producto_id=1):
+    db.expire_all()
+    return db.get(models.Producto, producto_id).stock
+
+
+def _guardadas(db):
+    return db.query(models.TareaPendiente).count()
+
+
+def _venta(api, cantidad=2):
+    respuesta = api.post("/ventas/", json={"id_cliente": 1, "detalles": [{"id_producto": 1, "cantidad": cantidad}]})
+    assert respuesta.status_code == 200, respuesta.text
+    return respuesta.json()["id"]
+
+
+def test_tarea_confirmada_con_el_cambio(api, db, monkeypatch):
+    sembrar(db, stock=10)
+    id_venta = _venta(api)
+    assert _stock(db) == 8
+    # Parada justo despues del commit: la devolucion de stock no llega a encolarse
+    monkeypatch.setattr(tareas.cola, "encolar_guardadas", lambda guardadas: None)
+    assert api.delete(f"/ventas/{id_venta}").status_code == 200
+    assert _stock(db) == 8
+    # La invalidacion de la cache no toca la base de datos y no se guarda
+    assert sorted(fila.nombre for fila in db.query(models.TareaPendiente)) == ["reportes", "stock"]
+    monkeypatch.undo()
+
+    # Al arrancar se recupera de la tabla y se aplica
+    asyncio.run(_arrancar_y_parar())
+    assert _stock(db) == 10
+    assert _guardadas(db) == 0
+
+
+async def _arrancar_y_parar():
+    await tareas.cola.iniciar()
+    await tareas.cola.detener(timeout=30)
+
+
+def test_tarea_repetida_se_aplica_una_vez(db):
+    sembrar(db, stock=5)
+    guardadas = tareas.guardar(db, [("stock", {"cantidades": [[1, 2]]})])
+    db.commit()
+    tareas.cola.encolar_guardadas(guardadas)
+    # Encolada otra vez (p. ej. recuperada al arrancar mientras se aplicaba)
+    tareas.cola.encolar_guardadas(guardadas)
+    assert _stock(db) == 7
+    assert _guardadas(db) == 0
+
+
+def test_tarea_fallida_queda_guardada(db, monkeypatch):
+    sembrar(db, stock=5)
+    guardadas = tareas.guardar(db, [("stock", {"cantidades": [[1, 2]]})])
+    db.commit()
+
+    def fallar(db, devoluciones):
+        raise RuntimeError("base de datos caida")
+
+    monkeypatch.setitem(tareas._manejadores, "stock", (fallar, True))
+    tareas.cola.encolar_guardadas(guardadas)
+    fila = db.query(models.TareaPendiente).one()
+    assert (fila.nombre, fila.intentos) == ("stock", 1)
+    monkeypatch.undo()
+
+    asyncio.run(_arrancar_y_parar())
+    assert _stock(db) == 7
@@ -0,0 +1,41 @@
+import pytest
+
+import crud, schemas
+from conftest import contar_sentencias, sembrar
+
+
+@pytest.fixture
+def catalogo(db):
+    sembrar(db, clientes=1, productos=60, stock=5)
+
+
+def test_errores_por_linea(api, catalogo):
+    # Todas las lineas que no se pueden servir en un solo 422
+    venta = {"id_cliente": 1, "detalles": [
+        {"id_producto": 1, "cantidad": 1},
+        {"id_producto": 999, "cantidad": 1},
+        {"id_producto": 2, "cantidad": 6},
+    ]}
+    respuesta = api.post("/ventas/", json=venta)
+    assert respuesta.status_code == 422
+    assert [(error["loc"], error["type"]) for error in respuesta.json()["detail"]] == [
+        (["body", "detalles", 1, "id_producto"], "producto_no_encontrado"),
+        (["body", "detalles", 2, "cantidad"], "stock_insuficiente"),
+    ]
+
+
+def test_stock_sumado_por_producto(api, catalogo):
+    # Dos lineas del mismo producto suman sus unidades; si solo falta stock es un 409
+    venta = {"id_cliente": 1, "detalles": [{"id_producto": 3, "cantidad": 3}, {"id_producto": 3, "cantidad": 3}]}
+    assert api.post("/ventas/", json=venta).status_code == 409
+
+
+@pytest.mark.parametrize("lineas", [1, 10, 60])
+def test_validacion_con_una_consulta(db, catalogo, lineas):
+    detalles = [schemas.DetalleVentaCreate(id_producto=i, cantidad=1) for i in range(1, lineas + 1)]
+    detalles.append(schemas.DetalleVentaCreate(id_producto=999, cantidad=1))
+    with contar_sentencias() as sentencias:
+        with pytest.raises(crud.PedidoInvalidoError) as error:
+            crud.cargar_productos_pedido(db, detalles, "precio_venta")
+    assert len(sentencias) == 1
+    assert [e["loc"][2] for e in error.value.errores] == [lineas]